@@ -0,0 +1,99 @@
+"""
+Time the extraction of the hub modules of a synthetic repository (see synthetic_repo.py), the modules with the
+most import statements, without bounds and with max_depth, max_nodes and max_bytes (see ExtractionBudget).
+Each run reports the time, the number and source size of the extracted nodes and the truncated nodes
+
+Usage:
+    python benchmark/bench_budget.py --files 1000 --star 0.5 --hubs 3 --depths 1 2 --nodes 200 --bytes 65536
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from synthetic_repo import make_repo
+
+
+def count_imports(path: str) -> int:
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.startswith(("import ", "from ")))
+
+
+def hub_modules(repo_src: str, n: int) -> list:
+    from pydepcall.extractor import get_modules_from_repo
+
+    modules = []
+    get_modules_from_repo(repo_src, modules)
+    return sorted(modules, key= count_imports, reverse= True)[:n]
+
+
+def extracted_nodes(module_node) -> dict:
+    """
+    Nodes reached from the functions and import statements of a module
+    """
+    from pydepcall.dependency_graph import node_key
+    from pydepcall.budget import node_size
+
+    seen = {}
+    stack = module_node.function_list + module_node.import_list
+    while stack:
+        node = stack.pop()
+        if node_key(node) in seen:
+            continue
+        seen[node_key(node)] = node
+        stack.extend(getattr(node, "children", []))
+    return {"nodes": len(seen),
+            "bytes": sum(node_size(x) for x in seen.values()),
+            "truncated": sum(1 for x in seen.values() if getattr(x, "truncated", False))}
+
+
+def measure(repo_src: str, module: str, bounds: dict) -> dict:
+    from pydepcall import Extractor
+
+    start = time.perf_counter()
+    # with a lazy repo graph, only the files reached by the extraction are parsed
+    module_node = Extractor(repo_src, module= module, lazy_graph= True, **bounds).extract()
+    result = {"bounds": bounds, "time": round(time.perf_counter() - start, 4)}
+    result.update(extracted_nodes(module_node))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--star", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hubs", type=int, default=3)
+    parser.add_argument("--depths", type=int, nargs="*", default=[1, 2])
+    parser.add_argument("--nodes", type=int, nargs="*", default=[200])
+    parser.add_argument("--bytes", type=int, nargs="*", default=[64 * 1024])
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    sys.path.insert(0, args.src)
+
+    runs = [{}] + [{"max_depth": x} for x in args.depths] + [{"max_nodes": x} for x in args.nodes] + [{"max_bytes": x} for x in args.bytes]
+    report = {"config": {"files": args.files, "functions": args.functions, "fanout": args.fanout, "star": args.star, "seed": args.seed},
+              "modules": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo_src = os.path.join(tmp_dir, "repo")
+        make_repo(repo_src, args.files, args.functions, args.fanout, star= args.star, seed= args.seed)
+        for module in hub_modules(repo_src, args.hubs):
+            results = [measure(repo_src, module, bounds) for bounds in runs]
+            report["modules"].append({"module": os.path.relpath(module, repo_src), "runs": results})
+            print("{}: {}".format(os.path.relpath(module, repo_src),
+                                  ", ".join("{} {}s {} nodes".format(x["bounds"] or "unbounded", x["time"], x["nodes"]) for x in results)), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
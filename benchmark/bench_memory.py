@@ -0,0 +1,99 @@
+"""
+Measure the memory of a repository extraction on a synthetic repository (see synthetic_repo.py): peak RSS during the
+extraction and RSS retained by the output, with the parsed trees released (default) or kept
+
+Each measurement runs in a fresh process. Pass --baseline-src with the `src` directory of another
+checkout of pydepcall (e.g. a git worktree of an older commit) to measure it the same way
+
+Usage:
+    python benchmark/bench_memory.py --files 500 --functions 30
+    python benchmark/bench_memory.py --baseline-src /tmp/pydepcall-old/src
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_repo import make_repo
+
+
+def current_rss() -> int:
+    """
+    Current resident set size in bytes (Linux)
+    """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(repo_src: str, keep_trees: bool) -> dict:
+    from pydepcall import Extractor
+
+    start_rss = current_rss()
+    start = time.perf_counter()
+    try:
+        extractor = Extractor(repo_src, keep_trees= keep_trees)
+    except TypeError: # versions without keep_trees always keep the trees
+        extractor = Extractor(repo_src)
+    output = extractor.extract()
+    elapsed = time.perf_counter() - start
+    del extractor
+    gc.collect()
+    # give the freed memory back to the system, so that RSS only counts what the output retains
+    if sys.platform.startswith("linux"):
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+
+    return {"modules": len(output),
+            "functions": sum(len(x.function_list) for x in output.values()),
+            "time": round(elapsed, 3),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "retained_rss_mb": round((current_rss() - start_rss) / 1024 / 1024, 1)}
+
+
+def run_child(src: str, repo_src: str, keep_trees: bool) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child", repo_src, "--src", src]
+    if keep_trees:
+        command.append("--keep-trees")
+    return json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--functions", type=int, default=30)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline-src", default=None)
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--keep-trees", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        sys.path.insert(0, args.src)
+        print(json.dumps(measure(args.child, args.keep_trees)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo_src = os.path.join(tmp_dir, "repo")
+        make_repo(repo_src, args.files, args.functions, args.fanout, seed= args.seed)
+
+        runs = []
+        if args.baseline_src is not None:
+            runs.append(("baseline", args.baseline_src, True))
+        runs.extend([("keep_trees=True", args.src, True), ("keep_trees=False", args.src, False)])
+
+        print("repo: {} modules x {} functions".format(args.files, args.functions))
+        for name, src, keep_trees in runs:
+            result = run_child(src, repo_src, keep_trees)
+            print("{:<18} time: {:>7.2f}s | peak RSS: {:>8.1f} MB | retained by output: {:>8.1f} MB".format(
+                name, result["time"], result["peak_rss_mb"], result["retained_rss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
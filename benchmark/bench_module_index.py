@@ -0,0 +1,92 @@
+"""
+Compare absolute import resolution of the recursive repo graph walk (search_by_repo_graph)
+with the flat ModuleIndex on a synthetic repo graph
+
+Pass --src with the `src` directory of another checkout (e.g. a git worktree) to benchmark it
+
+Usage:
+    python benchmark/bench_module_index.py --modules 10000 --imports 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+
+def make_repo_graph(n_modules: int, fanout: int= 10, identifiers: int= 20, seed: int= 0):
+    """
+    Build a synthetic repo graph (same format as get_repo_graph) with `n_modules` files,
+    `fanout` files and sub packages per package
+    """
+    rnd = random.Random(seed)
+    root = {"path": "repo", "childrens": {}}
+    modules = []
+    packages = [([], root)]
+    while len(modules) < n_modules:
+        dotted, package = packages.pop(0)
+        package["childrens"]["__init__.py"] = {"path": package["path"] + "/__init__.py", "childrens": ["exported_{}".format(len(modules))]}
+        for i in range(fanout):
+            if len(modules) >= n_modules:
+                break
+            name = "mod{}".format(len(modules))
+            package["childrens"][name + ".py"] = {"path": "{}/{}.py".format(package["path"], name),
+                                                  "childrens": ["func{}".format(rnd.randrange(identifiers * 10)) for _ in range(identifiers)]}
+            modules.append((dotted + [name], package["childrens"][name + ".py"]["childrens"]))
+        for i in range(fanout):
+            name = "pkg{}".format(len(packages) + len(modules) + i)
+            sub_package = {"path": "{}/{}".format(package["path"], name), "childrens": {}}
+            package["childrens"][name] = sub_package
+            packages.append((dotted + [name], sub_package))
+    return root, modules
+
+
+def make_imports(modules, n_imports: int, seed: int= 0):
+    rnd = random.Random(seed)
+    imports = []
+    for _ in range(n_imports):
+        dotted, identifiers = rnd.choice(modules)
+        kind = rnd.random()
+        if kind < 0.5: # from pkg.mod import func
+            imports.append({"package": ".".join(dotted), "module": rnd.choice(identifiers)})
+        elif kind < 0.8: # import pkg.mod
+            imports.append({"package": None, "module": ".".join(dotted)})
+        else: # third party
+            imports.append({"package": "numpy.linalg", "module": "norm"})
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=10000)
+    parser.add_argument("--imports", type=int, default=200)
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    args = parser.parse_args()
+    sys.path.insert(0, args.src)
+    from pydepcall.travel_graph import search_by_repo_graph
+    from pydepcall.module_index import ModuleIndex
+
+    repo_graph, modules = make_repo_graph(args.modules)
+    imports = make_imports(modules, args.imports)
+
+    start = time.perf_counter()
+    expected = [search_by_repo_graph(dict(x), repo_graph, None) for x in imports]
+    graph_walk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    module_index = ModuleIndex(repo_graph)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [module_index.resolve(dict(x)) for x in imports]
+    index_time = time.perf_counter() - start
+
+    assert results == expected, "ModuleIndex and search_by_repo_graph disagree"
+    print("modules: {}, imports: {}".format(args.modules, args.imports))
+    print("search_by_repo_graph: {:.3f}s ({:.1f}us/import)".format(graph_walk_time, graph_walk_time / len(imports) * 1e6))
+    print("ModuleIndex build:    {:.3f}s".format(build_time))
+    print("ModuleIndex resolve:  {:.3f}s ({:.1f}us/import)".format(index_time, index_time / len(imports) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Time the phases of an extraction on synthetic repositories (see synthetic_repo.py) of increasing size:
+get_repo_graph, import_analyze, FunctionNode construction, get_dependencies and Extractor.repo_extract.
+The result is printed (or written with --output) as JSON, with the time and peak RSS of each phase
+
+The first four phases run one after the other in a fresh process, each one reusing the parse cache,
+repo graph and module index of the previous ones. repo_extract runs alone in another fresh process.
+Pass --src with the `src` directory of another checkout (e.g. a git worktree) to benchmark it.
+A phase failing in the benchmarked checkout is recorded with its error instead of its time
+
+Usage:
+    python benchmark/bench_suite.py --files 10 100 1000 --output results.json
+    python benchmark/bench_suite.py --files 1000 --functions 20 --fanout 5 --star 0.3 --src /tmp/pydepcall-old/src
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_repo import make_repo
+
+
+def current_rss() -> int:
+    """
+    Current resident set size in bytes (Linux)
+    """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_phase(results: dict, name: str, function, *args):
+    gc.collect()
+    start_rss = current_rss()
+    start = time.perf_counter()
+    try:
+        value = function(*args)
+    except Exception as e: # e.g. a phase missing in the benchmarked checkout
+        results[name] = {"error": repr(e)}
+        return None
+    results[name] = {"time": round(time.perf_counter() - start, 4),
+                     "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                     "rss_delta_mb": round((current_rss() - start_rss) / 1024 / 1024, 1)}
+    return value
+
+
+def measure_phases(repo_src: str) -> dict:
+    """
+    The modules of the series (parse_cache, module_index) are imported by the phases using them:
+    a checkout without them runs the phases with the original APIs, which parse the files in each call
+    """
+    from pydepcall.build_repo_graph import get_repo_graph
+    from pydepcall.travel_graph import import_analyze
+    from pydepcall.extractor import get_modules_from_repo, get_functions_from_module_file, get_import_from_module_file, get_dependencies
+
+    results = {}
+    try:
+        from pydepcall.parse_cache import ParseCache
+        parse_cache = ParseCache()
+    except ImportError:
+        parse_cache = None
+    cache_args = (parse_cache,) if parse_cache is not None else ()
+    modules = []
+    get_modules_from_repo(repo_src, modules)
+
+    def build_repo_graph():
+        if parse_cache is None:
+            return get_repo_graph(repo_src)
+        return get_repo_graph(repo_src, parse_cache= parse_cache)
+    repo_graph = run_phase(results, "get_repo_graph", build_repo_graph)
+
+    try:
+        from pydepcall.module_index import ModuleIndex
+        index_args = cache_args + (ModuleIndex(repo_graph),)
+    except ImportError:
+        index_args = cache_args
+    except Exception as e:
+        results["module_index"] = {"error": repr(e)}
+        index_args = cache_args
+
+    def analyze_imports():
+        count = 0
+        for module in modules:
+            if parse_cache is not None:
+                import_nodes = parse_cache.get(module).imports
+            else:
+                import_nodes = [x.tree_sitter_node for x in get_import_from_module_file(module)]
+            for import_node in import_nodes:
+                count += len(import_analyze([import_node], module, repo_graph, *index_args))
+        return count
+    results["import_details"] = run_phase(results, "import_analyze", analyze_imports)
+
+    def build_function_nodes():
+        nodes = []
+        for module in modules:
+            for function_node in get_functions_from_module_file(module, *cache_args):
+                # the metadata needed to link the dependencies is computed on first access
+                function_node.called_identifiers
+                nodes.append(function_node)
+        return nodes
+    function_nodes = run_phase(results, "function_nodes", build_function_nodes)
+    results["extracted_functions"] = len(function_nodes or [])
+
+    def link_dependencies():
+        module_function_dict = {"function": {}, "import": {}}
+        for module in modules:
+            for node in get_functions_from_module_file(module, *cache_args) + get_import_from_module_file(module, *cache_args):
+                get_dependencies(node, module_function_dict, repo_src, repo_graph, *index_args)
+        return module_function_dict
+    run_phase(results, "get_dependencies", link_dependencies)
+    return results
+
+
+def measure_repo_extract(repo_src: str) -> dict:
+    results = {}
+    def repo_extract():
+        from pydepcall import Extractor
+        return Extractor(repo_src).repo_extract()
+    output = run_phase(results, "repo_extract", repo_extract)
+    results["extracted_modules"] = len(output or {})
+    return results
+
+
+def run_child(src: str, mode: str, repo_src: str) -> dict:
+    """
+    Run a measure in a fresh process. A crash of the process is recorded as the error of the measure
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, repo_src, "--src", src]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        error = process.stderr.strip().split("\n")[-1] or "exit status {}".format(process.returncode)
+        return {mode: {"error": error}}
+    return json.loads(process.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--relative", type=float, default=0.3)
+    parser.add_argument("--star", type=float, default=0.1)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        sys.path.insert(0, args.src)
+        mode, repo_src = args.child
+        print(json.dumps(measure_phases(repo_src) if mode == "phases" else measure_repo_extract(repo_src)))
+        return
+
+    report = {"src": os.path.abspath(args.src),
+              "config": {"functions": args.functions, "fanout": args.fanout, "relative": args.relative,
+                         "star": args.star, "depth": args.depth, "seed": args.seed},
+              "runs": []}
+    for n_files in args.files:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo_src = os.path.join(tmp_dir, "repo")
+            repo = make_repo(repo_src, n_files, args.functions, args.fanout, args.relative, args.star, args.depth, seed= args.seed)
+            phases = run_child(args.src, "phases", repo_src)
+            extract = run_child(args.src, "repo_extract", repo_src)
+        run = {"repo": repo, "phases": {}}
+        for results in [phases, extract]:
+            for name, value in results.items():
+                if type(value) is dict:
+                    run["phases"][name] = value
+                else:
+                    run["repo"][name] = value
+        report["runs"].append(run)
+        print("{} files: {}".format(n_files, ", ".join("{} {}s".format(name, x.get("time")) for name, x in run["phases"].items())), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
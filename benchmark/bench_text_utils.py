@@ -0,0 +1,84 @@
+"""
+Time the code cleaning utilities (map_line_to_id, remove_content, remove_comment, code_basic_clean)
+on generated python files of increasing size. The time per thousand lines stays flat when they scale linearly
+
+Pass --src with the `src` directory of another checkout (e.g. a git worktree) to benchmark it
+
+Usage:
+    python benchmark/bench_text_utils.py --lines 1000 5000 20000 --output results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def make_source(n_lines: int) -> str:
+    """
+    Python source of about `n_lines` lines with comments, docstrings and calls
+    """
+    lines = ["# generated module", "\"\"\"Module docstring\"\"\"", "import os", ""]
+    i = 0
+    while len(lines) < n_lines:
+        lines.append("def func_{}(a, b=2):  # définition {}".format(i, i))
+        lines.append("    \"\"\"Function {}\"\"\"".format(i))
+        lines.append("    # compute the total")
+        lines.append("    total = os.path.join(str(a), str(b)) + func_{}(a)".format(max(i - 1, 0)))
+        lines.append("    return total")
+        lines.append("")
+        i += 1
+    return "\n".join(lines)
+
+
+def best_time(function, *args, repeat: int= 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(n_lines: int) -> dict:
+    from pydepcall.utils.parser_utils import map_line_to_id, remove_content, remove_comment, code_basic_clean, get_root_node, get_node_by_kind
+
+    source = make_source(n_lines)
+    call_positions = [(node.start_point, node.end_point) for node in get_node_by_kind(get_root_node(source), ["call"], avoid_nested= True)]
+    results = {"lines": n_lines, "calls": len(call_positions)}
+    for name, function, args in [("map_line_to_id", map_line_to_id, (bytes(source, "utf8"),)),
+                                 ("remove_content", remove_content, (source, call_positions)),
+                                 ("remove_comment", remove_comment, (source,)),
+                                 ("code_basic_clean", code_basic_clean, (source,))]:
+        try:
+            seconds = best_time(function, *args)
+        except Exception as e: # e.g. a broken utility in the benchmarked checkout
+            results[name] = {"error": repr(e)}
+            continue
+        results[name] = {"time": round(seconds, 5), "ms_per_kline": round(seconds * 1000 * 1000 / n_lines, 4)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    sys.path.insert(0, args.src)
+
+    report = {"src": os.path.abspath(args.src), "runs": []}
+    for n_lines in args.lines:
+        run = measure(n_lines)
+        report["runs"].append(run)
+        print("{} lines: {}".format(n_lines, ", ".join("{} {}s".format(name, x.get("time")) for name, x in run.items() if type(x) is dict)), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare the previous recursive traversal (traverse_type) with the iterative cursor walk
+of get_node_by_kind / iter_node_by_kind on a large synthetic file
+
+Pass --src with the `src` directory of another checkout (e.g. a git worktree) to benchmark it
+
+Usage:
+    python benchmark/bench_traversal.py --functions 2000 --nesting 40 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def recursive_traverse_type(node, results, kind, ignore_kind, avoid_nested= False) -> None:
+    """
+    The recursive implementation replaced by iter_node_by_kind, kept here as the reference
+    """
+    if kind is None:
+        results.append(node)
+    elif node.type in kind:
+        results.append(node)
+        if avoid_nested:
+            return
+    if not node.children:
+        return
+    for n in node.children:
+        if n.type in ignore_kind:
+            continue
+        recursive_traverse_type(n, results, kind, ignore_kind, avoid_nested= avoid_nested)
+
+
+def make_source(n_functions: int, nesting: int) -> bytes:
+    """
+    Build a module with `n_functions` functions, each containing calls and an expression nested `nesting` times
+    """
+    lines = []
+    for i in range(n_functions):
+        lines.append("def func{}(a, b=1, *args, **kwargs):".format(i))
+        lines.append("    \"\"\"Docstring of func{}\"\"\"".format(i))
+        lines.append("    x = " + "(" * nesting + "a + b" + ")" * nesting)
+        lines.append("    for item in args:")
+        lines.append("        x = helper{}(item, x) if item else other.method(x)".format(i % 50))
+        lines.append("    return [y * 2 for y in range(x)]")
+        lines.append("")
+    return "\n".join(lines).encode("utf8")
+
+
+def measure(function, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--nesting", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    args = parser.parse_args()
+    sys.path.insert(0, args.src)
+    from pydepcall.utils import language_parser, get_node_by_kind, iter_node_by_kind
+
+    source = make_source(args.functions, args.nesting)
+    root = language_parser.parse(source).root_node
+    queries = {"all nodes": (None, [], False),
+               "identifiers": (["identifier"], [], False),
+               "top functions": (["function_definition"], [], True)}
+
+    print("source: {:.1f} MB, nesting: {}".format(len(source) / 1e6, args.nesting))
+    for name, (kind, ignore_kind, avoid_nested) in queries.items():
+        def recursive():
+            results = []
+            recursive_traverse_type(root, results, kind, ignore_kind, avoid_nested)
+            return results
+        def iterative():
+            return get_node_by_kind(root, kind, ignore_kind= ignore_kind, avoid_nested= avoid_nested)
+        def streaming():
+            # consume without materializing the list
+            count = 0
+            for _ in iter_node_by_kind(root, kind, ignore_kind= ignore_kind, avoid_nested= avoid_nested):
+                count += 1
+            return count
+
+        recursive_time, expected = measure(recursive, args.repeat)
+        iterative_time, results = measure(iterative, args.repeat)
+        streaming_time, count = measure(streaming, args.repeat)
+        assert [x.id for x in results] == [x.id for x in expected] and count == len(expected)
+        print("{:<14} {:>8} nodes | recursive: {:.3f}s | get_node_by_kind: {:.3f}s | iter_node_by_kind: {:.3f}s".format(
+            name, len(expected), recursive_time, iterative_time, streaming_time))
+
+
+if __name__ == "__main__":
+    main()
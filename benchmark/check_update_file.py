@@ -0,0 +1,173 @@
+"""
+Check Extractor.update_file against a fresh extraction on a synthetic repository (see synthetic_repo.py).
+Each scenario edits a module file after an extraction (body edit, deleted function, added function,
+changed import, prepended line, each alone and all combined, and two files changed together with update_files),
+updates the extraction and compares the functions, import statements, their dependencies and the reverse index
+with those of Extractor(...).extract() on the edited repository, with keep_trees True and False.
+Exits with status 1 if an update differs from the fresh extraction
+
+Usage:
+    python benchmark/check_update_file.py --files 30 --functions 4 --fanout 3
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from synthetic_repo import make_repo
+
+
+def edit_body(lines: list, dotted: str) -> list:
+    """
+    Call the last function of the file from the body of the first one
+    """
+    defs = [i for i, x in enumerate(lines) if x.startswith("def ")]
+    callee = lines[defs[-1]][len("def "):].split("(")[0]
+    return lines[:defs[0] + 1] + ["    extra = {}(a)".format(callee)] + lines[defs[0] + 1:]
+
+
+def delete_function(lines: list, dotted: str) -> list:
+    """
+    Remove the first function of the file, imported by its package __init__.py
+    """
+    start = next(i for i, x in enumerate(lines) if x.startswith("def "))
+    end = start + 1
+    while end < len(lines) and (lines[end].startswith(" ") or not lines[end]):
+        end += 1
+    return lines[:start] + lines[end:]
+
+
+def add_function(lines: list, dotted: str) -> list:
+    callee = next(x for x in lines if x.startswith("def "))[len("def "):].split("(")[0]
+    return lines + ["", "def added_function(a):", "    return {}(a)".format(callee)]
+
+
+def change_import(lines: list, dotted: str) -> list:
+    """
+    Replace the first import statement with a star import of another module
+    """
+    first = next(i for i, x in enumerate(lines) if x.startswith(("import ", "from ")))
+    return lines[:first] + ["from {} import *".format(dotted)] + lines[first + 1:]
+
+
+def prepend_line(lines: list, dotted: str) -> list:
+    return ["# prepended line"] + lines
+
+
+EDITS = {"body": edit_body, "delete_function": delete_function, "add_function": add_function,
+         "change_import": change_import, "prepend_line": prepend_line}
+
+
+def canonical(extractor, modules: list) -> dict:
+    """
+    Functions and import statements of each module with the keys of their dependencies (see dependency_key),
+    and the reverse index
+    """
+    from pydepcall.extractor import build_module_node
+    from pydepcall.reverse_index import dependency_key
+
+    def describe(node):
+        return [dependency_key(node), node.content, node.position_in_file,
+                sorted(dependency_key(x) for x in getattr(node, "children", []))]
+
+    result = {}
+    for module in modules:
+        module_node = build_module_node(module, extractor.module_function_dict)
+        result[module] = {"functions": [describe(x) for x in module_node.function_list],
+                          "imports": [describe(x) for x in module_node.import_list]}
+    reverse_index = extractor.reverse_index
+    return {"modules": result,
+            "dependencies": {k: sorted(v) for k, v in reverse_index.dependencies.items()},
+            "dependents": {k: sorted(v) for k, v in reverse_index.dependents.items()}}
+
+
+def first_difference(got: dict, expected: dict) -> str:
+    for part in ["dependencies", "dependents"]:
+        for key in sorted(set(got[part]) | set(expected[part]), key= repr):
+            if got[part].get(key) != expected[part].get(key):
+                return "{} of {}: {} != {}".format(part, key, got[part].get(key), expected[part].get(key))
+    for module in sorted(expected["modules"]):
+        for part in ["functions", "imports"]:
+            got_nodes, expected_nodes = got["modules"][module][part], expected["modules"][module][part]
+            for a, b in zip(got_nodes, expected_nodes):
+                if a != b:
+                    return "{} of {}: {} != {}".format(part, module, a, b)
+            if len(got_nodes) != len(expected_nodes):
+                return "{} of {}: {} != {} nodes".format(part, module, len(got_nodes), len(expected_nodes))
+    return "no difference"
+
+
+def run_scenario(template: str, work_dir: str, edits: dict, keep_trees: bool) -> str:
+    """
+    Apply `edits` ({relative path: [edit names]}) to a copy of the repository after an extraction
+
+    Return:
+        None if the updated extraction matches a fresh one, the first difference otherwise
+    """
+    from pydepcall import Extractor
+
+    repo_src = os.path.join(work_dir, "repo")
+    shutil.rmtree(repo_src, ignore_errors= True)
+    shutil.copytree(template, repo_src)
+    extractor = Extractor(repo_src, keep_trees= keep_trees)
+    # the extraction only keeps weak references to the nodes referenced by its output
+    output = extractor.extract()
+    modules = sorted(output)
+
+    paths = []
+    for relative_path, names in edits.items():
+        path = os.path.join(repo_src, relative_path)
+        # star import of the module after this one in the extraction order
+        other = os.path.relpath(modules[(modules.index(path) + 1) % len(modules)], repo_src)
+        dotted = os.path.splitext(other)[0].replace(os.sep, ".")
+        with open(path) as f:
+            lines = f.read().split("\n")
+        for name in names:
+            lines = EDITS[name](lines, dotted)
+        with open(path, "w") as f:
+            f.write("\n".join(lines))
+        paths.append(path)
+    if len(paths) == 1:
+        extractor.update_file(paths[0])
+    else:
+        extractor.update_files(paths)
+
+    fresh = Extractor(repo_src)
+    fresh_output = fresh.extract()
+    got, expected = canonical(extractor, sorted(fresh_output)), canonical(fresh, sorted(fresh_output))
+    return None if got == expected else first_difference(got, expected)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--functions", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--star", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--src", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    args = parser.parse_args()
+    sys.path.insert(0, args.src)
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template = os.path.join(tmp_dir, "template")
+        make_repo(template, args.files, args.functions, args.fanout, star= args.star, seed= args.seed)
+        module_files = sorted(os.path.relpath(os.path.join(root, x), template) for root, _, files in os.walk(template)
+                              for x in files if x.startswith("mod"))
+        target, other = module_files[0], module_files[len(module_files) // 2]
+        scenarios = [(name, {target: [name]}) for name in EDITS]
+        scenarios.append(("combined", {target: list(EDITS)}))
+        scenarios.append(("combined, two files", {target: list(EDITS), other: list(EDITS)}))
+
+        for keep_trees in [True, False]:
+            for name, edits in scenarios:
+                difference = run_scenario(template, tmp_dir, edits, keep_trees)
+                print("{:<20} keep_trees={!s:<5} {}".format(name, keep_trees, "ok" if difference is None else "MISMATCH " + difference))
+                failures += difference is not None
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
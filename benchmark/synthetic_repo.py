@@ -0,0 +1,129 @@
+"""
+Generator of synthetic python repositories for the benchmarks
+
+Files are spread over a tree of packages (each with an __init__.py re-exporting a function).
+Every file defines functions calling the functions it imports from other files, with a mix of
+absolute (`from pkg.mod import f`, `import pkg.mod`), relative (`from .mod import f`) and star
+(`from pkg.mod import *`) imports
+
+Usage:
+    python benchmark/synthetic_repo.py /tmp/repo --files 1000 --functions 10 --fanout 3 --depth 3
+"""
+import argparse
+import os
+import random
+
+
+def make_packages(n_packages: int, depth: int, rnd: random.Random):
+    """
+    Dotted names of `n_packages` packages nested at most `depth` levels
+    """
+    packages = [["pkg0"]]
+    # packages which can contain a sub package
+    parents = [["pkg0"]] if depth > 1 else []
+    for i in range(1, n_packages):
+        parent = rnd.choice(parents) if parents and rnd.random() < 0.7 else []
+        packages.append(parent + ["pkg{}".format(i)])
+        if len(packages[-1]) < depth:
+            parents.append(packages[-1])
+    return packages
+
+
+def make_repo(repo_src: str, n_files: int, n_functions: int= 10, fanout: int= 3, relative: float= 0.3, star: float= 0.1,
+              depth: int= 3, files_per_package: int= 10, seed: int= 0) -> dict:
+    """
+    Write a synthetic repository
+
+    Args:
+        repo_src: directory of the repository (created)
+        n_files: number of module files (without the __init__.py files)
+        n_functions: functions defined in each file
+        fanout: import statements of each file
+        relative: share of the imports which are relative (to a file of the same package)
+        star: share of the imports which are star imports
+        depth: maximum nesting of the packages
+        files_per_package: module files in each package
+        seed: seed of the random generator
+
+    Return:
+        {"files", "packages", "functions", "imports"}: size of the generated repository
+    """
+    rnd = random.Random(seed)
+    packages = make_packages(max(1, (n_files + files_per_package - 1) // files_per_package), depth, rnd)
+    # module i is "mod{i}" in package i % len(packages)
+    modules = [packages[i % len(packages)] + ["mod{}".format(i)] for i in range(n_files)]
+    package_modules = {}
+    for i, dotted in enumerate(modules):
+        package_modules.setdefault(tuple(dotted[:-1]), []).append(i)
+
+    for dotted in packages:
+        package_dir = os.path.join(repo_src, *dotted)
+        os.makedirs(package_dir, exist_ok=True)
+        members = package_modules.get(tuple(dotted), [])
+        with open(os.path.join(package_dir, "__init__.py"), "w") as f:
+            if members:
+                f.write("from .mod{0} import func{0}_0\n".format(members[0]))
+
+    n_imports = 0
+    for i, dotted in enumerate(modules):
+        lines = []
+        callees = []
+        for _ in range(fanout):
+            j = rnd.randrange(n_files)
+            kind = rnd.random()
+            siblings = package_modules[tuple(dotted[:-1])]
+            if kind < relative and len(siblings) > 1:
+                j = rnd.choice([x for x in siblings if x != i] or siblings)
+                name = "func{}_{}".format(j, rnd.randrange(n_functions))
+                lines.append("from .mod{} import {}".format(j, name))
+            elif kind < relative + star:
+                name = "func{}_{}".format(j, rnd.randrange(n_functions))
+                lines.append("from {} import *".format(".".join(modules[j])))
+            elif kind < relative + star + (1 - relative - star) / 2:
+                name = "func{}_{}".format(j, rnd.randrange(n_functions))
+                lines.append("from {} import {}".format(".".join(modules[j]), name))
+            else:
+                lines.append("import {}".format(".".join(modules[j])))
+                name = "{}.func{}_{}".format(".".join(modules[j]), j, rnd.randrange(n_functions))
+            callees.append(name)
+            n_imports += 1
+        lines.append("import os")
+        lines.append("")
+        lines.append("CONSTANT_{} = {}".format(i, i))
+        lines.append("")
+        for k in range(n_functions):
+            lines.append("def func{}_{}(a, b=2, *args, **kwargs):".format(i, k))
+            lines.append("    \"\"\"Function {} of module {}\"\"\"".format(k, i))
+            lines.append("    values = [x * a for x in range(b) if x % 3]")
+            lines.append("    total = {}(a, values) if args else os.path.join(str(a), str(b))".format(rnd.choice(callees) if callees else "str"))
+            if k > 0:
+                lines.append("    total = func{}_{}(total, values)".format(i, k - 1))
+            lines.append("    for key, value in kwargs.items():")
+            lines.append("        total = helper_{}(total, key, value, CONSTANT_{})".format(i, i))
+            lines.append("    return total")
+            lines.append("")
+        lines.append("def helper_{}(total, *rest):".format(i))
+        lines.append("    return total")
+        lines.append("")
+        with open(os.path.join(repo_src, *dotted) + ".py", "w") as f:
+            f.write("\n".join(lines))
+
+    return {"files": n_files, "packages": len(packages), "functions": n_files * (n_functions + 1), "imports": n_imports}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repo_src")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--relative", type=float, default=0.3)
+    parser.add_argument("--star", type=float, default=0.1)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_repo(args.repo_src, args.files, args.functions, args.fanout, args.relative, args.star, args.depth, seed= args.seed))
+
+
+if __name__ == "__main__":
+    main()
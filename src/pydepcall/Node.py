@@ -1,9 +1,11 @@
+import bisect
 from codetext.parser import PythonParser
 import tree_sitter
 from typing import List, Dict
 
 from .travel_graph import import_analyze
-from .utils import get_root_node, get_node_by_kind, remove_content, find_all_substring
+from .parse_cache import SourceFile
+from .utils import PY_LANGUAGE, get_node_by_kind, iter_node_by_kind, get_definition_name
 
 
 class ModuleNode:
@@ -22,9 +24,83 @@ class ModuleNode:
         
 
 
-class FunctionNode:
+class SourceNode:
     """
-    Function node object
+    Base of the nodes located in a module file. The node keeps its byte range in the source buffer
+    shared by all nodes of the file (see SourceFile) instead of a copy of its content and a
+    tree-sitter node, so that extracted nodes do not hold the parsed trees
+
+    Attributes:
+        path (str): the local path of file containing the node
+        content (str): the node content in text, decoded from the source buffer when read
+        position_in_file (tuple): start, end position of the node in module file
+        tree_sitter_node (tree_sitter.Node): Node parsed from file using tree-sitter, the file is parsed again
+            if its tree was released. None for nodes restored from an index (see PersistentIndex)
+        source_file (SourceFile): source buffer of the module file
+        start_byte, end_byte (int): byte range of the node in the source buffer
+    """
+    __slots__ = ("path", "position_in_file", "source_file", "start_byte", "end_byte", "_content", "_tree_sitter_node", "__weakref__")
+    # tree-sitter types of the node, to find it again in the tree
+    node_types = ()
+
+    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node, source_file: SourceFile= None):
+        self.path = path
+        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point) if tree_sitter_node is not None else None
+        self.source_file = source_file
+        self.start_byte = tree_sitter_node.start_byte if tree_sitter_node is not None else None
+        self.end_byte = tree_sitter_node.end_byte if tree_sitter_node is not None else None
+        self._content = content
+        # without a source buffer, the tree-sitter node is the only way to the content
+        self._tree_sitter_node = tree_sitter_node if source_file is None else None
+
+    @property
+    def content(self) -> str:
+        if self._content is not None:
+            return self._content
+        if self.source_file is not None:
+            return self.source_file.text(self.start_byte, self.end_byte)
+        return self._tree_sitter_node.text.decode()
+
+    @content.setter
+    def content(self, content: str) -> None:
+        self._content = content
+
+    @property
+    def tree_sitter_node(self) -> tree_sitter.Node:
+        if self.source_file is not None:
+            return self.source_file.node_at(self.start_byte, self.end_byte, self.node_types)
+        return self._tree_sitter_node
+
+    @tree_sitter_node.setter
+    def tree_sitter_node(self, tree_sitter_node: tree_sitter.Node) -> None:
+        self.source_file = None
+        self._tree_sitter_node = tree_sitter_node
+
+    def relocate(self, tree_sitter_node: tree_sitter.Node, source_file: SourceFile) -> None:
+        """
+        Point the node to its range in a new source of its file (see Extractor.update_file)
+        """
+        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point)
+        self.source_file = source_file
+        self.start_byte = tree_sitter_node.start_byte
+        self.end_byte = tree_sitter_node.end_byte
+        self._content = None
+        self._tree_sitter_node = None
+
+    def __getattr__(self, attribute: str):
+        # Only called for the (lazy) attributes which are not computed yet
+        if self.compute_attribute(attribute):
+            return getattr(self, attribute)
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, attribute))
+
+    def compute_attribute(self, attribute: str) -> bool:
+        return False
+
+
+class FunctionNode(SourceNode):
+    """
+    Function node object. The metadata (signature, name, params, return_type, docstring,
+    called_identifiers) is computed from the tree-sitter node on first access
 
     Attributes:
         path (str): the local path of file containing the function
@@ -38,23 +114,76 @@ class FunctionNode:
         tree_sitter_node (tree_sitter.Node): Node parsed from file using tree-sitter
         signature (str): function signature
         children (list): List of called dependencies
+        truncated (bool): its dependencies were not all extracted, beyond the bounds of the extraction (see ExtractionBudget)
     """
-    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node):
-        self.path = path
-        self.content = content
-        self.tree_sitter_node = tree_sitter_node
+    __slots__ = ("signature", "name", "params", "return_type", "docstring", "called_identifiers", "children", "truncated")
+    node_types = ("function_definition",)
 
-        self.signature = self.get_signature()
-        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point)
-        self.name, self.params, self.return_type, self.docstring = self.get_metadata()
-        self.called_identifiers = self.get_called_identifiers()
+    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node, metadata: Dict= None, source_file: SourceFile= None):
+        super().__init__(path, content, tree_sitter_node, source_file)
+
+        # metadata could be precomputed by another process (see parallel.py)
+        if metadata is not None:
+            for attribute, value in metadata.items():
+                setattr(self, attribute, value)
 
         self.children = []
 
-    def get_metadata(self):
-        function_metadata = PythonParser.get_function_metadata(self.tree_sitter_node)
-        docstring = PythonParser.get_docstring(self.tree_sitter_node)
-        return function_metadata["identifier"], function_metadata["parameters"], function_metadata["return_type"], docstring
+    def compute_attribute(self, attribute: str) -> bool:
+        if attribute == "signature":
+            self.signature = self.get_signature()
+        elif attribute == "name":
+            self.name = get_definition_name(self.tree_sitter_node)
+        elif attribute in ["params", "return_type"]:
+            self.params, self.return_type = self.get_params(), self.get_return_type()
+        elif attribute == "docstring":
+            self.docstring = PythonParser.get_docstring(self.tree_sitter_node)
+        elif attribute == "called_identifiers":
+            self.called_identifiers = self.get_called_identifiers()
+        elif attribute == "truncated":
+            self.truncated = False
+        else:
+            return False
+        return True
+
+    def reset_metadata(self) -> None:
+        """
+        Forget the metadata computed from the tree-sitter node (e.g. after the function changed), except the name
+        """
+        for attribute in ["signature", "params", "return_type", "docstring", "called_identifiers"]:
+            try:
+                delattr(self, attribute)
+            except AttributeError:
+                pass
+
+    def get_params(self) -> Dict:
+        """
+        Parameters of the function and their type annotation (None if not annotated), without *args and **kwargs.
+        Walked without recursion (see iter_node_by_kind), so deeply nested default values do not overflow the stack
+        """
+        params = {}
+        parameters = self.tree_sitter_node.child_by_field_name("parameters")
+        if parameters is None:
+            return params
+        for parameter in parameters.children:
+            if parameter.type == "identifier":
+                params[parameter.text.decode()] = None
+            elif parameter.type in ["typed_parameter", "default_parameter", "typed_default_parameter"]:
+                identifier = next(iter_node_by_kind(parameter, ["identifier"]))
+                param_type = next(iter_node_by_kind(parameter, ["type"]), None)
+                params[identifier.text.decode()] = param_type.text.decode() if param_type is not None else None
+        return params
+
+    def get_return_type(self) -> str:
+        """
+        Return type annotation of the function, "<not_specific>" if it is not annotated but returns something
+        """
+        return_type = self.tree_sitter_node.child_by_field_name("return_type")
+        if return_type is not None:
+            return return_type.text.decode()
+        if next(iter_node_by_kind(self.tree_sitter_node, ["return_statement"]), None) is not None:
+            return "<not_specific>"
+        return None
 
     def get_called_identifiers(self):
         # Do not consider parameter identifier. Do not forget to exclude self identifier
@@ -78,9 +207,9 @@ class FunctionNode:
         return output
         
 
-class ClassNode:
+class ClassNode(SourceNode):
     """
-    Class node object
+    Class node object. The name is computed from the tree-sitter node on first access
 
     Attributes:
         path (str): the local path of file containing the function
@@ -89,21 +218,21 @@ class ClassNode:
         position_in_file (tuple): start, end position of class in module file
         tree_sitter_node (tree_sitter.Node): Node parsed from file using tree-sitter
     """
-    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node):
-        self.path = path
-        self.content = content    
-        self.tree_sitter_node = tree_sitter_node
-
-        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point)
-        self.name = self.get_name()
+    __slots__ = ("name",)
+    node_types = ("class_definition",)
 
+    def compute_attribute(self, attribute: str) -> bool:
+        if attribute == "name":
+            self.name = self.get_name()
+            return True
+        return False
 
     def get_name(self):
         return PythonParser.get_class_metadata(self.tree_sitter_node)["identifier"]
 
-class BlockNode:
+class BlockNode(SourceNode):
     """
-    Block node object
+    Block node object. The name is computed from the tree-sitter node on first access
 
     Attributes:
         path (str): the local path of file containing the function
@@ -112,81 +241,125 @@ class BlockNode:
         position_in_file (tuple): start, end position of block in module file
         tree_sitter_node (tree_sitter.Node): Node parsed from file using tree-sitter
     """
-    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node):
-        self.path = path
-        self.content = content
-        self.tree_sitter_node = tree_sitter_node
-        self.name = self.get_name()
-        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point)
+    __slots__ = ("name",)
+    node_types = ("expression_statement",)
+
+    def compute_attribute(self, attribute: str) -> bool:
+        if attribute == "name":
+            self.name = self.get_name()
+            return True
+        return False
 
     def get_name(self):
         return get_node_by_kind(self.tree_sitter_node, kind=["identifier"])[0].text.decode()
 
-class ImportNode:
+class ImportNode(SourceNode):
     """
-    Import node object
+    Import node object. The content is kept, it identifies the import statement in its module file
 
     Attributes:
         path (str): the local path of file containing the function
         content (str): the function content in text
         position_in_file (tuple): start, end position of import statement in module file
         tree_sitter_node (tree_sitter.Node): Node parsed from file using tree-sitter
+        import_dict (list): parsed import of the statement (see import_analyze)
         children (list): List of called dependencies
+        truncated (bool): its dependencies were not all extracted, beyond the bounds of the extraction (see ExtractionBudget)
     """
-    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node):
-        self.path = path
-        self.content = content
-        self.tree_sitter_node = tree_sitter_node
+    __slots__ = ("import_dict", "children", "truncated")
+    node_types = ("import_statement", "import_from_statement", "future_import_statement")
 
-        self.position_in_file = (tree_sitter_node.start_point, tree_sitter_node.end_point)
+    def __init__(self, path: str, content: str, tree_sitter_node: tree_sitter.Node, source_file: SourceFile= None):
+        super().__init__(path, content, tree_sitter_node, source_file)
         self.import_dict = []
         self.children = []
 
+    def compute_attribute(self, attribute: str) -> bool:
+        # nodes restored from an index or a result file are complete unless they were saved truncated
+        if attribute == "truncated":
+            self.truncated = False
+            return True
+        return False
+
+
 
+# Single pass over a function: called expressions, identifiers and the strings and comments
+# which are ignored when reading the called name
+DEPENDENCY_QUERY = PY_LANGUAGE.query("""
+(call) @call
+(identifier) @identifier
+(string) @skipped
+(comment) @skipped
+""")
 
-def remove_parentheses(input_string):
+def get_called_name(source: bytes, start: int, end: int, skipped_ranges: List) -> str:
     """
-    Remove all parentheses "()" and the content inside
-    of a calling statement
+    Get the called name of a calling statement, without the parentheses "()" and the content inside
     
-    Examples:
-    >>> remove_parentheses("something.call(abc)")
-    something.call
+    Args:
+        source: text of the calling statement in bytes
+        start, end: range of the called expression in source (before the argument list)
+        skipped_ranges: sorted ranges of strings and comments in source
 
-    >>> remove_parentheses("something.call().find('xyz')")
-    something.call.find
+    Examples:
+        something.call(abc) -> something.call
+        something.call().find('xyz') -> something.call.find
     """
-    
-    root_node = get_root_node(input_string)
-    rm_positions = []
-    
-    # Remove string so that we can avoid parentheses in string
-    for node in get_node_by_kind(root_node, kind=["string"], avoid_nested=True):
-        rm_positions.append((node.start_point, node.end_point)) 
-    string = remove_content(input_string, rm_positions)
-
-    # Remove all parentheses
-    open_indexes = find_all_substring("\(", string)
-    close_indexes = find_all_substring("\)", string)
-    assert len(open_indexes) == len(close_indexes), input_string
-    modified_string = string[0:open_indexes[0]]
-    for cid, close_index in enumerate(close_indexes):
-        if cid == len(close_indexes) - 1:
-            modified_string += string[close_index+1:]
-        else:
-            modified_string += string[close_index+1:open_indexes[cid+1]]
-    return modified_string
+    segments = []
+    position = start
+    for skipped_start, skipped_end in skipped_ranges[bisect.bisect_left(skipped_ranges, (start,)):]:
+        if skipped_start >= end:
+            break
+        if skipped_start > position:
+            segments.append(source[position:skipped_start])
+        position = max(position, skipped_end)
+    if position < end:
+        segments.append(source[position:end])
+
+    kept = []
+    depth = 0
+    for segment in segments:
+        if depth == 0 and b"(" not in segment and b")" not in segment:
+            kept.append(segment)
+            continue
+        # Remove all parentheses
+        for char in segment:
+            if char == 40: # (
+                depth += 1
+            elif char == 41: # )
+                depth -= 1
+            elif depth == 0:
+                kept.append(bytes((char,)))
+    return b"".join(kept).decode("utf8", errors="ignore")
 
 def get_dependencies(function_node):
     """
-    
+    Get the identifiers called inside a function: the identifiers used in the function,
+    except attributes (e.g. abc.call) which are not called directly elsewhere
     """
+    call_nodes = []
+    identifier_nodes = []
+    skipped_ranges = []
+    for node, capture_name in DEPENDENCY_QUERY.captures(function_node):
+        if capture_name == "call":
+            call_nodes.append(node)
+        elif capture_name == "identifier":
+            identifier_nodes.append(node)
+        else:
+            skipped_ranges.append((node.start_byte, node.end_byte))
+
+    source = function_node.text
+    offset = function_node.start_byte
+    skipped_ranges = [(start - offset, end - offset) for start, end in skipped_ranges]
 
     must_contain_identifiers = set()
     exclude_identifiers = set()
 
-    for call_node in get_node_by_kind(function_node, kind=["call"]):
-        call_content = remove_parentheses(call_node.text.decode())
+    for call_node in call_nodes:
+        # the argument list is always inside parentheses, only the called expression is read
+        arguments = call_node.child_by_field_name("arguments")
+        call_end = arguments.start_byte if arguments is not None else call_node.end_byte
+        call_content = get_called_name(source, call_node.start_byte - offset, call_end - offset, skipped_ranges)
         identifiers = call_content.split(".")
 
         if len(identifiers) == 1:
@@ -195,14 +368,8 @@ def get_dependencies(function_node):
             exclude_identifiers.update(identifiers[1:])
     
     included_identifiers = set()
-    for identifier_node in get_node_by_kind(function_node, kind=["identifier"]):
+    for identifier_node in identifier_nodes:
         identifier_text = identifier_node.text.decode()
         if identifier_text in must_contain_identifiers or identifier_text not in exclude_identifiers:
             included_identifiers.add(identifier_text)
     return included_identifiers
-
-    
-    
-
-
-
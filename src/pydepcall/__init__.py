@@ -1 +1,7 @@
-from .extractor import Extractor
\ No newline at end of file
+from .extractor import Extractor
+from .async_extractor import AsyncExtractor, get_async_extractor
+from .parse_cache import ParseCache
+from .instrumentation import Instrumentation
+from .batch import batch_extract
+from .serialization import save_result, load_result, export_jsonl
+from .dependency_graph import DependencyGraph, build_dependency_graph
@@ -0,0 +1,220 @@
+import os
+import asyncio
+import weakref
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .constant import ASYNC_MAX_CONCURRENCY, ASYNC_PREFETCH_WINDOW
+from .extractor import Extractor, get_modules_from_repo
+from .Node import ModuleNode
+
+
+def read_file(path: str) -> Tuple[str, Optional[str], Optional[Tuple[int, int]]]:
+    """
+    Read a module file for the parse cache
+
+    Return:
+        (path, content, (st_mtime_ns, st_size) taken before the read), content is None if the file can not be read
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return path, f.read(), (stat.st_mtime_ns, stat.st_size)
+    except:
+        return path, None, None
+
+
+class AsyncExtractor:
+    """
+    Asyncio interface of an Extractor, which never blocks the event loop.
+
+    The extractor is not thread-safe, so all its work (parsing, linking dependencies) runs on one thread
+    owned by the AsyncExtractor; files are read beforehand by `read_executor` with at most `max_concurrency`
+    reads in flight, the module files at most `prefetch_window` modules ahead of the extraction.
+    Extractions of the same AsyncExtractor run one at a time: concurrent `extract` calls share the same
+    extraction, and its output is kept until `invalidate` is called. Cancelling a call stops the
+    extraction after the module being extracted (once no other call waits for it).
+    Progress callbacks of the extractor's instrumentation run on the extraction thread
+
+    Attributes:
+        extractor (Extractor): extractor of the repository (or of one module)
+        max_concurrency (int): maximum number of files read at the same time
+        read_executor (Executor): executor of the file reads, the default executor of the loop if None
+        prefetch_window (int): maximum number of module files read ahead of the module being extracted
+    """
+    def __init__(self, extractor: Extractor, max_concurrency: int= ASYNC_MAX_CONCURRENCY, read_executor: Executor= None, prefetch_window: int= ASYNC_PREFETCH_WINDOW):
+        self.extractor = extractor
+        self.max_concurrency = max_concurrency
+        self.prefetch_window = prefetch_window
+        self.read_executor = read_executor
+        self.executor = ThreadPoolExecutor(max_workers= 1, thread_name_prefix= "pydepcall")
+        self._lock = asyncio.Lock()
+        self._result = None
+        self._task = None
+        self._waiters = 0
+
+    async def __aenter__(self) -> "AsyncExtractor":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait= False, cancel_futures= True)
+
+    def invalidate(self) -> None:
+        """
+        Forget the output of the last extraction, e.g. after the repository changed.
+        With keep_trees=True, the next extraction only parses the changed files again
+        """
+        self._result = None
+
+    async def run(self, function, *args):
+        """
+        Run a function on the extraction thread
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def extract(self):
+        """
+        Same output as Extractor.extract, shared by the concurrent calls
+        """
+        if self._result is not None:
+            return self._result
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._extract())
+            self._task.add_done_callback(self._extract_done)
+
+        task = self._task
+        self._waiters += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # the extraction is cancelled with its last waiting call
+            if self._waiters == 1 and not task.done():
+                task.cancel()
+                # the next call starts a new extraction, once the cancelled one released the lock
+                if self._task is task:
+                    self._task = None
+            raise
+        finally:
+            self._waiters -= 1
+
+    def _extract_done(self, task: asyncio.Task) -> None:
+        if self._task is task:
+            self._task = None
+        if not task.cancelled() and task.exception() is None:
+            self._result = task.result()
+
+    async def _extract(self):
+        async with self._lock:
+            if self.extractor.module is not None:
+                await self.prefetch([self.extractor.module])
+                return await self.run(self.extractor.extract)
+
+            output = {}
+            async for module_node in self._iter_modules():
+                output[module_node.path] = module_node
+            return output
+
+    async def iter_extract(self) -> AsyncIterator[ModuleNode]:
+        """
+        Yield the ModuleNode of each module as soon as it is extracted (see Extractor.iter_extract),
+        or the modules of the kept output of the last extraction.
+        Close the iterator if it is not exhausted (e.g. `async with contextlib.aclosing(...)`):
+        other extractions wait for it
+        """
+        async with self._lock:
+            if self._result is not None:
+                for module_node in self._result.values():
+                    yield module_node
+                return
+            async for module_node in self._iter_modules():
+                yield module_node
+
+    async def _iter_modules(self) -> AsyncIterator[ModuleNode]:
+        modules = []
+        await self.run(get_modules_from_repo, self.extractor.repo_src, modules, self.extractor.scanner)
+
+        # The module files are read in the extraction order, in a window running ahead of the extraction:
+        # each module is extracted once its file is cached, while the next ones are read
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        paths = iter(modules)
+        reads = deque()
+        generator = self.extractor.iter_extract()
+        try:
+            while True:
+                while len(reads) < max(self.prefetch_window, 1):
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    reads.append(asyncio.ensure_future(self.load(path, semaphore)))
+                if reads:
+                    await reads.popleft()
+                module_node = await self.run(next, generator, None)
+                if module_node is None:
+                    return
+                yield module_node
+        finally:
+            for read in reads:
+                read.cancel()
+            # after the step in progress, on the extraction thread
+            try:
+                self.executor.submit(generator.close)
+            except RuntimeError: # closed AsyncExtractor
+                pass
+
+    async def prefetch(self, paths: List[str]) -> None:
+        """
+        Read files with at most `max_concurrency` reads in flight, each file being parsed
+        into the parse cache of the extractor while the next ones are read.
+        Stops reading once the parse cache is full
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*[self.load(path, semaphore) for path in paths])
+
+    async def load(self, path: str, semaphore: asyncio.Semaphore) -> None:
+        """
+        Read a file in `read_executor` (at most `max_concurrency` reads in flight with `semaphore`) and parse it
+        into the parse cache on the extraction thread, unless it is already cached or the parse cache is full
+        """
+        parse_cache = self.extractor.parse_cache
+        async with semaphore:
+            if path in parse_cache or parse_cache.full:
+                return
+            path, content, signature = await asyncio.get_running_loop().run_in_executor(self.read_executor, read_file, path)
+        # the next reads do not wait for the extraction thread
+        if content is not None:
+            await self.run(parse_cache.add_file, path, content, signature)
+
+
+# AsyncExtractor shared by the requests of the same repository, per event loop
+_shared_extractors: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_extractor(repo_src: str, max_concurrency: int= ASYNC_MAX_CONCURRENCY, **extractor_kwargs) -> AsyncExtractor:
+    """
+    Get the AsyncExtractor of a repository shared by all callers with the same arguments, so that
+    concurrent requests extract (and parse) the repository once. The Extractor is built in an executor
+
+    Args:
+        repo_src: local path of the repository
+        max_concurrency: maximum number of files read at the same time
+        extractor_kwargs: arguments of Extractor (module, index_dir, keep_trees, ...)
+    """
+    loop = asyncio.get_running_loop()
+    shared = _shared_extractors.setdefault(loop, {})
+    key = (os.path.abspath(repo_src), max_concurrency, repr(sorted(extractor_kwargs.items())))
+    if key not in shared:
+        shared[key] = loop.run_in_executor(None, lambda: AsyncExtractor(Extractor(repo_src, **extractor_kwargs), max_concurrency))
+    future = shared[key]
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # the next call tries again
+        if shared.get(key) is future:
+            del shared[key]
+        raise
@@ -0,0 +1,136 @@
+import os
+import time
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional
+
+from .extractor import Extractor
+from .serialization import module_to_record
+from .utils import clone_repo
+
+try:
+    import resource
+except ImportError: # not available on Windows, memory limits are then ignored
+    resource = None
+
+
+def extract_repo(src: str, save_dir: str= "repos", **extractor_kwargs) -> Dict:
+    """
+    Extract a repository given by its local path or link (cloned into `save_dir` if needed)
+
+    Return:
+        {"repo": src, "path": local path of the repository, "modules": records of the modules (see module_to_record)}
+    """
+    repo_path = clone_repo(src, save_dir)
+    extractor = Extractor(repo_path, **extractor_kwargs)
+    # modules are converted while streaming, so the nodes of converted modules can be freed
+    modules = [module_to_record(x) for x in extractor.iter_extract()]
+    return {"repo": src, "path": repo_path, "modules": modules}
+
+
+def run_repo(connection, src: str, save_dir: str, max_memory: Optional[int], extractor_kwargs: Dict) -> None:
+    """
+    Entry point of the worker process of a repository, the result is sent through `connection`
+    """
+    try:
+        if max_memory is not None and resource is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+        result = extract_repo(src, save_dir, **extractor_kwargs)
+        result["status"] = "ok"
+        result["error"] = None
+    except MemoryError:
+        result = {"repo": src, "status": "failed", "error": "memory limit exceeded"}
+    except Exception:
+        result = {"repo": src, "status": "failed", "error": traceback.format_exc()}
+    connection.send(result)
+    connection.close()
+
+
+def batch_extract(repos: List[str], sink: Callable[[Dict], None]= None, workers: int= None, timeout: float= None, max_memory: int= None, save_dir: str= "repos", **extractor_kwargs) -> List[Dict]:
+    """
+    Extract many repositories with a pool of processes. Each repository is extracted in its own
+    process, which is killed if it exceeds the time limit. A failing repository is recorded
+    and does not stop the batch
+
+    Args:
+        repos: local paths or links of the repositories
+        sink: called in the main process with the result of each repository as soon as it is done
+            ({"repo", "path", "modules", "status", "error", "time"}, see extract_repo), in completion order
+        workers: number of processes, os.cpu_count() by default
+        timeout: time limit of a repository in seconds
+        max_memory: address space limit of a repository process in bytes
+        save_dir: directory where the links are cloned
+        extractor_kwargs: arguments of Extractor (e.g. index_dir)
+
+    Return:
+        Status of the repositories in the order of `repos`: {"repo", "status" ("ok" or "failed"), "error", "time", "modules" (number)}.
+        The status also contains the results ("modules" are the module records) if there is no sink
+    """
+    workers = workers or os.cpu_count() or 1
+    # fork shares the imported modules with the workers
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
+    statuses = [None] * len(repos)
+    pending = list(enumerate(repos))[::-1]
+    running = {} # sentinel -> (index, process, connection, start time)
+    # sentinels of the workers which closed their pipe without a result: only their exit is waited for
+    closed = set()
+
+    def finish(index: int, result: Dict, start: float) -> None:
+        result["time"] = time.perf_counter() - start
+        status = {"repo": result["repo"], "status": result["status"], "error": result["error"],
+                  "time": result["time"], "modules": len(result.get("modules", []))}
+        if sink is not None:
+            sink(result)
+        else:
+            status["modules"] = result.get("modules", [])
+        statuses[index] = status
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, src = pending.pop()
+            receiver, sender = context.Pipe(duplex= False)
+            process = context.Process(target= run_repo, args= (sender, src, save_dir, max_memory, extractor_kwargs), daemon= True)
+            process.start()
+            sender.close()
+            running[process.sentinel] = (index, process, receiver, time.perf_counter())
+
+        # Wake up when a worker sends its result or exits, or at the closest deadline
+        wait_time = None
+        if timeout is not None:
+            now = time.perf_counter()
+            wait_time = max(0, min(start + timeout - now for _, _, _, start in running.values()))
+        receivers = [x[2] for sentinel, x in running.items() if sentinel not in closed]
+        ready = set(wait(receivers + list(running.keys()), timeout= wait_time))
+
+        for sentinel, (index, process, receiver, start) in list(running.items()):
+            result = None
+            if receiver in ready or sentinel in ready:
+                try:
+                    # the result is read before the process exits: a large result fills the pipe
+                    if receiver.poll():
+                        result = receiver.recv()
+                except (EOFError, OSError):
+                    # the pipe stays readable at EOF, the process may still be exiting
+                    closed.add(sentinel)
+                # a ready sentinel means the process is exiting, join waits until it is reaped
+                if result is None and (sentinel in ready or not process.is_alive()):
+                    process.join()
+                    if process.exitcode is not None and process.exitcode < 0: # e.g. crash when the memory limit is reached
+                        error = "process killed by signal {}".format(-process.exitcode)
+                    else:
+                        error = "process exited with code {}".format(process.exitcode)
+                    result = {"repo": repos[index], "status": "failed", "error": error}
+            if result is None:
+                if timeout is None or time.perf_counter() - start < timeout:
+                    continue
+                process.kill()
+                result = {"repo": repos[index], "status": "failed", "error": "timeout after {}s".format(timeout)}
+
+            process.join()
+            receiver.close()
+            closed.discard(sentinel)
+            del running[sentinel]
+            finish(index, result, start)
+    return statuses
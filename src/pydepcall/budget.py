@@ -0,0 +1,103 @@
+import heapq
+import itertools
+from typing import List, Optional, Set, Tuple
+
+# Order of the nodes at the same depth: functions are expanded before import statements,
+# whose wildcard imports can reach every function of a file
+KIND_PRIORITY = {"function": 0, "import": 1}
+
+
+def node_size(node) -> int:
+    """
+    Size in bytes of the source of a node
+    """
+    if node.start_byte is not None:
+        return node.end_byte - node.start_byte
+    return len(node.content.encode("utf8"))
+
+
+class ExtractionBudget:
+    """
+    Bounds of the dependencies extracted from a set of roots (the functions and import statements of a module,
+    or one function for extract_symbol). The dependencies are expanded breadth-first from the roots, nearest first
+    (see get_bounded_dependencies): a node is not expanded beyond `max_depth` hops, and a new node is only extracted
+    if it fits in `max_nodes` and `max_bytes`. The nodes whose dependencies are not all extracted are marked `truncated`
+
+    Attributes:
+        max_depth (int): number of dependency hops expanded from the roots (at depth 0), no bound if None
+        max_nodes (int): maximum number of extracted nodes (functions, imports, classes and blocks), roots included
+        max_bytes (int): maximum size of the source of the extracted nodes
+        nodes (int): nodes extracted since the last reset
+        bytes (int): size of their source
+        depth (int): depth of the node being expanded
+    """
+    def __init__(self, max_depth: int= None, max_nodes: int= None, max_bytes: int= None):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.reset()
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_depth is not None or self.max_nodes is not None or self.max_bytes is not None
+
+    def reset(self) -> None:
+        """
+        Start the extraction of new roots
+        """
+        self.nodes = 0
+        self.bytes = 0
+        self.depth = 0
+        self._charged: Set[Tuple] = set()
+        self._expanded: Set[Tuple] = set()
+        self._queue: List = []
+        self._order = itertools.count()
+
+    @property
+    def exhausted(self) -> bool:
+        return (self.max_nodes is not None and self.nodes >= self.max_nodes) or \
+            (self.max_bytes is not None and self.bytes >= self.max_bytes)
+
+    def charge(self, key: Tuple, size: int, force: bool= False) -> bool:
+        """
+        Spend the budget of a node (see dependency_key) once
+
+        Args:
+            key: key of the node
+            size: size of its source in bytes
+            force: spend it even if it does not fit (roots)
+
+        Return:
+            False if the node does not fit in the budget
+        """
+        if key in self._charged:
+            return True
+        if not force and ((self.max_nodes is not None and self.nodes + 1 > self.max_nodes) or \
+                          (self.max_bytes is not None and self.bytes + size > self.max_bytes)):
+            return False
+        self._charged.add(key)
+        self.nodes += 1
+        self.bytes += size
+        return True
+
+    def push(self, node, key: Tuple, depth: int) -> None:
+        """
+        Queue the expansion of a node reached at `depth`, unless it was already expanded
+        """
+        if key not in self._expanded:
+            heapq.heappush(self._queue, (depth, KIND_PRIORITY[key[0]], next(self._order), key, node))
+
+    def pop(self) -> Optional[Tuple[int, Tuple, object]]:
+        """
+        Nearest node to expand: (depth, key, node), None once every queued node is expanded
+        """
+        while self._queue:
+            depth, _, _, key, node = heapq.heappop(self._queue)
+            # a node queued several times is expanded at its smallest depth
+            if key not in self._expanded:
+                self._expanded.add(key)
+                return depth, key, node
+        return None
+
+    def can_expand(self, depth: int) -> bool:
+        return (self.max_depth is None or depth < self.max_depth) and not self.exhausted
@@ -3,33 +3,38 @@ from codetext.parser import PythonParser
 from tree_sitter import Language, Parser
 import tree_sitter
 import os
-from typing import Dict
+from typing import Dict, List
 
-from .utils import get_node_by_kind, get_root_node, decorated_clean
-from .utils import language_parser as parser
-from .constant import PY_EXTENSIONS
+from .utils import get_node_by_kind
+from .parse_cache import ParseCache
+from .scanner import RepoScanner
 
-def get_identifier_in_file(filepath: str) -> Dict:
+def get_identifier_in_file(filepath: str, parse_cache: ParseCache= None) -> Dict:
     """
     Get identifiers of a file
 
     Args:
         filepath: the file path to get identifiers
+        parse_cache: cache of parsed files shared in the run
     """
-    try:
-        with open(filepath, "r") as f:
-            filecontent = f.read()
-        
-        # Clean decorated line so easier to detect node type by 1st level
-        filecontent = decorated_clean(filecontent)
-    except Exception as e:
-        # print(e)
+    if parse_cache is None:
+        parse_cache = ParseCache()
+
+    parsed_file = parse_cache.get(filepath)
+    if parsed_file is None:
         return {"path": filepath, "childrens": []}
-        
-    root_node = get_root_node(filecontent)
+    return {"path": filepath, "childrens": get_identifiers(parsed_file.root_node)}
 
+
+def get_identifiers(root_node: tree_sitter.Node) -> List[str]:
+    """
+    Identifiers defined at the top level of a parsed file (see get_identifier_in_file)
+    """
     all_modules = set()
     for children in root_node.children:
+        # Look through decorators so that node type is detected by 1st level
+        if children.type == "decorated_definition":
+            children = children.child_by_field_name("definition")
     
         if "import" in children.type:
             # Only consider the actual imported module
@@ -61,30 +66,70 @@ def get_identifier_in_file(filepath: str) -> Dict:
             if child_identifiers:
                 all_modules.add(child_identifiers[0])
 
-    return {"path": filepath, "childrens": list(all_modules)}
+    return list(all_modules)
+
+
+class LazyFileEntry(dict):
+    """
+    Repo graph entry of a file whose identifiers (see get_identifier_in_file) are only
+    extracted when its "childrens" are read for the first time
+    """
+    def __init__(self, filepath: str, parse_cache: ParseCache):
+        super().__init__(path= filepath)
+        self.parse_cache = parse_cache
+
+    def __missing__(self, key):
+        if key != "childrens":
+            raise KeyError(key)
+        self["childrens"] = get_identifier_in_file(self["path"], self.parse_cache)["childrens"]
+        return self["childrens"]
+
+
+def is_file_entry(graph: Dict) -> bool:
+    """
+    Whether a repo graph entry is a file (list of identifiers) or a folder,
+    without extracting the identifiers of a lazy entry
+    """
+    return type(graph.get("childrens", [])) is list
+
+
+def get_children(folder: str, parse_cache: ParseCache= None, known_identifiers: Dict= None, lazy: bool= False, scanner: RepoScanner= None) -> Dict:
+    if scanner is None:
+        scanner = RepoScanner(folder)
 
-    
-def get_children(folder: str) -> Dict:
     graph_child = {"path": folder, "childrens": {}}
-    for children in os.listdir(folder):
-        if os.path.isdir(os.path.join(folder, children)):
-            graph_child["childrens"][children] = get_children(os.path.join(folder, children))
-        elif children.endswith(PY_EXTENSIONS):
-            graph_child["childrens"][children] = get_identifier_in_file(os.path.join(folder, children))
+    for children, _, is_dir in scanner.entries(folder):
+        if is_dir:
+            graph_child["childrens"][children] = get_children(os.path.join(folder, children), parse_cache, known_identifiers, lazy, scanner)
+        elif known_identifiers and os.path.join(folder, children) in known_identifiers:
+            graph_child["childrens"][children] = known_identifiers[os.path.join(folder, children)]
+        elif lazy:
+            graph_child["childrens"][children] = LazyFileEntry(os.path.join(folder, children), parse_cache)
+        else:
+            graph_child["childrens"][children] = get_identifier_in_file(os.path.join(folder, children), parse_cache)
         
     return graph_child        
 
 
-def get_repo_graph(repo_src: str, save_graph_to: str= None) -> Dict:
+def get_repo_graph(repo_src: str, save_graph_to: str= None, parse_cache: ParseCache= None, known_identifiers: Dict= None, lazy: bool= False, scanner: RepoScanner= None) -> Dict:
     """
     Construct module graph for a repository
 
     Args:
         repo_src: the local path of the repository
         save_graph_to: directory to save the created graph
+        parse_cache: cache of parsed files shared in the run
+        known_identifiers: already computed identifiers (see get_identifier_in_file) of unchanged files
+        lazy: only list the files, their identifiers are extracted on first access (see LazyFileEntry)
+        scanner: lists the folders of the repository (see RepoScanner)
     """
-    graph = get_children(repo_src)
+    if parse_cache is None:
+        parse_cache = ParseCache()
+    graph = get_children(repo_src, parse_cache, known_identifiers, lazy, scanner or RepoScanner(repo_src))
     if save_graph_to:
+        # the saved graph contains the identifiers of every file
+        if lazy:
+            force_identifiers(graph)
 
         if not os.path.exists(save_graph_to):
             os.makedirs(save_graph_to)
@@ -92,4 +137,15 @@ def get_repo_graph(repo_src: str, save_graph_to: str= None) -> Dict:
         reponame = repo_src.split("/")[-1]
         with open(os.path.join(save_graph_to, f"{reponame}.json"), "w") as f:
             json.dump(graph, f, indent=4)
-    return graph
\ No newline at end of file
+    return graph
+
+
+def force_identifiers(graph: Dict) -> None:
+    """
+    Extract the identifiers of the lazy entries of a repo graph
+    """
+    if is_file_entry(graph):
+        graph["childrens"]
+        return
+    for child in graph["childrens"].values():
+        force_identifiers(child)
@@ -1,3 +1,15 @@
-
 PY_EXTENSIONS = (".py", ".py3", ".pyi", ".pyo", ".pyw")
-EXCLUDED_TYPING_IDENTIFIERS = ("int", "float", "bool", "str", "bytes", "List", "Set", "Dict", "Tuple", "Union", "Optional", "Any")
\ No newline at end of file
+EXCLUDED_TYPING_IDENTIFIERS = ("int", "float", "bool", "str", "bytes", "List", "Set", "Dict", "Tuple", "Union", "Optional", "Any")
+
+# Approximate memory budget of the per-run parse cache (source + tree-sitter tree)
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Folders skipped when the repository is scanned, besides hidden folders (.git, .tox, .venv, ...) and virtual environments
+EXCLUDED_DIRECTORIES = ("__pycache__", "venv", "site-packages")
+# Folders only skipped at the root of the repository, a package can have a sub-package with the same name (e.g. mypkg/build)
+ROOT_EXCLUDED_DIRECTORIES = ("build", "node_modules")
+
+# Files read concurrently by AsyncExtractor while the extraction thread parses them
+ASYNC_MAX_CONCURRENCY = 8
+# Module files read by AsyncExtractor.iter_extract ahead of the module being extracted
+ASYNC_PREFETCH_WINDOW = 32
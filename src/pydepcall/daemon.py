@@ -0,0 +1,305 @@
+"""
+Long-running extraction server: keeps the extraction, parse cache and reverse index of a repository in memory,
+polls the repository for changes, updates the modified files in place and answers JSON-RPC 2.0 queries, one JSON object per line, on stdio or a socket
+
+Usage:
+    python -m pydepcall.daemon REPO_SRC                          # stdio
+    python -m pydepcall.daemon REPO_SRC --socket /tmp/repo.sock  # unix socket (or HOST:PORT)
+
+Methods:
+    dependencies {"path", "name", "kind": "function", "transitive": false}
+    dependents {"path", "name", "kind": "function", "transitive": false}
+    update {}: look for changes now instead of waiting for the next poll
+    stats {}
+    shutdown {}
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import traceback
+import socketserver
+from typing import Dict, List, Optional, Tuple
+
+from .extractor import Extractor
+from .reverse_index import ReverseIndex
+
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class ExtractionDaemon:
+    """
+    Extraction of a repository kept up to date: changed files are found by polling (see Extractor.refresh).
+    Modified module files are updated in place (see Extractor.update_files). When files are added or removed,
+    the repository is extracted again: only the changed files are parsed again, the other nodes are restored from the index.
+    The index is saved by these extractions only, a restarted daemon extracts the files updated in place again.
+    Queries are answered from the reverse index of the last finished extraction, also while the next one runs
+
+    Attributes:
+        extractor (Extractor): extractor of the repository, with an index, keeping the parsed trees unless keep_trees=False is given
+        poll_interval (float): seconds between two checks of the repository, no polling if None
+        reverse_index (ReverseIndex): dependencies and dependents of the last finished extraction
+        updates (int): number of extractions
+        last_update (dict): {"time", "seconds", "changed", "incremental"} of the last update
+    """
+    def __init__(self, repo_src: str, index_dir: str= None, poll_interval: Optional[float]= 1.0, **extractor_kwargs):
+        # paths of the extraction are absolute, so the queries can give absolute or relative paths
+        repo_src = os.path.abspath(repo_src)
+        if index_dir is None:
+            index_dir = default_index_dir(repo_src)
+        # the parsed trees stay in the parse cache between two updates, only the changed files are parsed again
+        extractor_kwargs.setdefault("keep_trees", True)
+        self.extractor = Extractor(repo_src, index_dir= index_dir, **extractor_kwargs)
+        self.poll_interval = poll_interval
+        self.reverse_index = ReverseIndex()
+        self.updates = 0
+        self.last_update = None
+        self._update_lock = threading.Lock()
+        # held while the reverse index is updated in place, and by the queries
+        self._query_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+    @property
+    def repo_src(self) -> str:
+        return self.extractor.repo_src
+
+    def update(self, force: bool= False) -> Dict:
+        """
+        Update the extraction if files changed since the last update
+
+        Args:
+            force: extract the repository even if nothing changed (e.g. the first extraction)
+
+        Return:
+            {"changed": files changed since the last update, "seconds": time of the update,
+             "incremental": whether the files were updated in place}
+        """
+        with self._update_lock:
+            start = time.perf_counter()
+            self.extractor.refresh(rebuild_graph= False)
+            changed = sorted(self.extractor.index.refreshed)
+            if not changed and not force:
+                return {"changed": [], "seconds": 0.0, "incremental": False}
+
+            incremental = not force and self.updates > 0 and self.can_update_in_place(changed)
+            if incremental:
+                try:
+                    with self._query_lock:
+                        self.extractor.update_files(changed)
+                except Exception:
+                    # e.g. a file removed since the refresh, the repository is extracted again
+                    traceback.print_exc(file= sys.stderr)
+                    incremental = False
+            if not incremental:
+                self.extractor.reset_repo_graph()
+                for _ in self.extractor.iter_extract():
+                    pass
+                # queries switch to the new reverse index once it is complete
+                self.reverse_index = self.extractor.reverse_index
+
+            self.updates += 1
+            self.last_update = {"time": time.time(), "seconds": round(time.perf_counter() - start, 6), "changed": changed, "incremental": incremental}
+            return {"changed": changed, "seconds": self.last_update["seconds"], "incremental": incremental}
+
+    def can_update_in_place(self, changed: List[str]) -> bool:
+        """
+        Whether the changed files are all modified module files of the last extraction (not added, removed or __init__ files)
+        """
+        index = self.extractor.index
+        return all(path in index.modules and path not in index.added_or_removed for path in changed)
+
+    def start(self) -> None:
+        """
+        Extract the repository and start polling it in a background thread
+        """
+        self.update(force= True)
+        if self.poll_interval is not None and self._watcher is None:
+            self._watcher = threading.Thread(target= self.watch, name= "pydepcall-watch", daemon= True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def watch(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.update()
+            except Exception:
+                # a file being written can fail the extraction, the next poll tries again
+                traceback.print_exc(file= sys.stderr)
+
+    def resolve_path(self, path: str) -> str:
+        """
+        Path of a file as in the extraction, given its absolute path or its path relative to the repository
+        """
+        return os.path.normpath(os.path.join(self.repo_src, path))
+
+    def query(self, method: str, path: str, name: str, kind: str= "function", transitive: bool= False) -> List[Dict]:
+        key = (kind, self.resolve_path(path), name)
+        with self._query_lock:
+            if method == "dependencies":
+                keys = self.reverse_index.get_dependencies(key, transitive)
+            else:
+                keys = self.reverse_index.get_dependents(key, transitive)
+        return [key_to_json(x) for x in sorted(keys, key= str)]
+
+    def stats(self) -> Dict:
+        return {"repo_src": self.repo_src,
+                "nodes": len(self.reverse_index),
+                "updates": self.updates,
+                "last_update": self.last_update,
+                "extractor": self.extractor.stats()}
+
+    def handle(self, request: Dict) -> Optional[Dict]:
+        """
+        Answer a JSON-RPC 2.0 request, None for a notification (no id)
+        """
+        request_id = request.get("id") if type(request) is dict else None
+        try:
+            if type(request) is not dict or type(request.get("method")) is not str:
+                raise RPCError(INVALID_REQUEST, "invalid request")
+            method = request["method"]
+            params = request.get("params", {})
+            if type(params) is list:
+                params = dict(zip(["path", "name", "kind", "transitive"], params))
+            if type(params) is not dict:
+                raise RPCError(INVALID_PARAMS, "params must be an object or an array")
+
+            if method in ["dependencies", "dependents"]:
+                if type(params.get("path")) is not str or type(params.get("name")) is not str:
+                    raise RPCError(INVALID_PARAMS, "path and name are required")
+                result = self.query(method, params["path"], params["name"], params.get("kind", "function"), bool(params.get("transitive", False)))
+            elif method == "update":
+                result = self.update()
+            elif method == "stats":
+                result = self.stats()
+            elif method == "shutdown":
+                self.stop()
+                result = None
+            else:
+                raise RPCError(METHOD_NOT_FOUND, "method not found: {}".format(method))
+        except RPCError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": e.message}}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": INTERNAL_ERROR, "message": repr(e)}}
+        if type(request) is dict and "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def handle_line(self, line: str) -> Optional[str]:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return json.dumps({"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": "parse error"}})
+        response = self.handle(request)
+        return json.dumps(response) if response is not None else None
+
+    def serve_stdio(self, stdin= None, stdout= None) -> None:
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+        for line in stdin:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                stdout.write(response + "\n")
+                stdout.flush()
+            if self._stopped.is_set():
+                return
+
+    def serve_socket(self, address: str) -> None:
+        """
+        Serve the connections of a unix socket (a path) or a TCP socket ("HOST:PORT"), one thread per connection
+        """
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    response = daemon.handle_line(line.decode("utf8"))
+                    if response is not None:
+                        self.wfile.write((response + "\n").encode("utf8"))
+                        self.wfile.flush()
+                    if daemon._stopped.is_set():
+                        threading.Thread(target= server.shutdown, daemon= True).start()
+                        return
+
+        host_port = parse_tcp_address(address)
+        if host_port is None:
+            if os.path.exists(address):
+                os.remove(address)
+            server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            server = socketserver.ThreadingTCPServer(host_port, Handler)
+        server.daemon_threads = True
+        with server:
+            server.serve_forever()
+
+
+def default_index_dir(repo_src: str) -> str:
+    """
+    Index directory of a repository in the user cache ($XDG_CACHE_HOME or ~/.cache), outside the watched working tree
+    """
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    key = hashlib.blake2b(os.path.abspath(repo_src).encode("utf8"), digest_size= 8).hexdigest()
+    return os.path.join(cache_dir, "pydepcall", "{}-{}".format(os.path.basename(os.path.abspath(repo_src)), key))
+
+
+def parse_tcp_address(address: str) -> Optional[Tuple[str, int]]:
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return host, int(port)
+    return None
+
+
+def key_to_json(key: Tuple) -> Dict:
+    """
+    JSON form of a reverse index key (see dependency_key)
+    """
+    node_type, path, name = key
+    if node_type in ["class", "block"]:
+        return {"type": node_type, "path": path, "position": list(name)}
+    return {"type": node_type, "path": path, "name": name}
+
+
+def main():
+    parser = argparse.ArgumentParser(description= "Serve the dependencies of a repository, kept up to date")
+    parser.add_argument("repo_src")
+    parser.add_argument("--socket", default= None, help= "unix socket path or HOST:PORT, stdio if not given")
+    parser.add_argument("--index-dir", default= None, help= "index directory, in ~/.cache/pydepcall by default")
+    parser.add_argument("--poll-interval", type= float, default= 1.0)
+    parser.add_argument("--include", nargs= "*", default= None)
+    parser.add_argument("--exclude", nargs= "*", default= None)
+    parser.add_argument("--lazy-graph", action= "store_true")
+    parser.add_argument("--no-keep-trees", action= "store_true", help= "release the parsed trees after each update to save memory")
+    args = parser.parse_args()
+
+    daemon = ExtractionDaemon(args.repo_src, args.index_dir, args.poll_interval,
+                              include= args.include, exclude= args.exclude, lazy_graph= args.lazy_graph, keep_trees= not args.no_keep_trees)
+    daemon.start()
+    if args.socket is None:
+        daemon.serve_stdio()
+    else:
+        daemon.serve_socket(args.socket)
+
+
+if __name__ == "__main__":
+    main()
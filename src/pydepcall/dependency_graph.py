@@ -0,0 +1,245 @@
+from array import array
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Union, Iterable
+
+from .Node import ModuleNode, FunctionNode, ImportNode, ClassNode, BlockNode
+
+
+def iter_module_nodes(modules) -> Iterator[ModuleNode]:
+    if isinstance(modules, ModuleNode):
+        return iter([modules])
+    if isinstance(modules, dict):
+        return iter(modules.values())
+    return iter(modules)
+
+
+def node_key(node):
+    # Class and block nodes are created for each dependency, the same definition is numbered once
+    if type(node) in [ClassNode, BlockNode]:
+        return (type(node).__name__, node.path, node.position_in_file)
+    return id(node)
+
+
+class DependencyGraph:
+    """
+    Dependencies of the extracted nodes as an integer graph. Nodes are numbered densely from 0
+    (breadth-first from the modules), the children of node i are
+    edge_targets[edge_offsets[i]:edge_offsets[i + 1]] (CSR adjacency)
+
+    Attributes:
+        edge_offsets (array): start of the children of each node in edge_targets, n + 1 items
+        edge_targets (array): ids of the children
+        nodes (list): node of each id
+    """
+    def __init__(self, edge_offsets, edge_targets, nodes, node_ids: Dict= None):
+        self.edge_offsets = edge_offsets
+        self.edge_targets = edge_targets
+        self.nodes = nodes
+        self._node_ids = node_ids
+        self._function_ids = None
+        self._reverse = None
+        self._components = None
+        # visited marks of the traversals, a node is visited by the current traversal if its mark is the current stamp
+        self._marks = array("I", [0]) * len(self)
+        self._stamp = 0
+
+    def __len__(self) -> int:
+        return len(self.edge_offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_targets)
+
+    def node(self, node_id: int):
+        return self.nodes[node_id]
+
+    def node_id(self, node) -> int:
+        """
+        Id of an extracted node (FunctionNode, ImportNode, ClassNode or BlockNode)
+        """
+        if self._node_ids is None:
+            self._node_ids = {node_key(x): i for i, x in enumerate(self.nodes)}
+        return self._node_ids[node_key(node)]
+
+    def find(self, path: str, name: str) -> Optional[int]:
+        """
+        Id of the function `name` defined in the file `path`, None if it is not in the graph
+        """
+        if self._function_ids is None:
+            self._function_ids = {}
+            for i in range(len(self)):
+                node = self.nodes[i]
+                if type(node) is FunctionNode:
+                    self._function_ids[(node.path, node.name)] = i
+        return self._function_ids.get((path, name))
+
+    def dependencies(self, node_id: int):
+        """
+        Ids of the direct dependencies (children) of a node
+        """
+        return self.edge_targets[self.edge_offsets[node_id]:self.edge_offsets[node_id + 1]]
+
+    def dependents(self, node_id: int):
+        """
+        Ids of the nodes which directly depend on a node
+        """
+        reverse_offsets, reverse_targets = self.reverse_edges()
+        return reverse_targets[reverse_offsets[node_id]:reverse_offsets[node_id + 1]]
+
+    def reverse_edges(self):
+        """
+        CSR adjacency of the reversed graph, built on first use
+        """
+        if self._reverse is None:
+            n = len(self)
+            counts = array("I", [0]) * (n + 1)
+            for target in self.edge_targets:
+                counts[target + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            reverse_offsets = array("I", counts)
+            reverse_targets = array("I", [0]) * len(self.edge_targets)
+            offsets, targets = self.edge_offsets, self.edge_targets
+            for source in range(n):
+                for j in range(offsets[source], offsets[source + 1]):
+                    target = targets[j]
+                    reverse_targets[counts[target]] = source
+                    counts[target] += 1
+            self._reverse = (reverse_offsets, reverse_targets)
+        return self._reverse
+
+    def transitive_dependencies(self, node_id: int) -> List[int]:
+        """
+        Ids of the nodes reachable from a node, in depth-first order. The node itself is not included
+        """
+        return self.reachable(node_id, self.edge_offsets, self.edge_targets)
+
+    def transitive_dependents(self, node_id: int) -> List[int]:
+        """
+        Ids of the nodes which (transitively) depend on a node. The node itself is not included
+        """
+        return self.reachable(node_id, *self.reverse_edges())
+
+    def reachable(self, node_id: int, offsets, targets) -> List[int]:
+        self._stamp += 1
+        if self._stamp == 0xFFFFFFFF:
+            self._marks = array("I", [0]) * len(self)
+            self._stamp = 1
+        marks, stamp = self._marks, self._stamp
+
+        marks[node_id] = stamp
+        result = []
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            for child in targets[offsets[current]:offsets[current + 1]]:
+                if marks[child] != stamp:
+                    marks[child] = stamp
+                    result.append(child)
+                    stack.append(child)
+        return result
+
+    def strongly_connected_components(self) -> List[List[int]]:
+        """
+        Strongly connected components (iterative Tarjan), computed once. A component is listed
+        after the components it depends on
+
+        Return:
+            list of components, each one a list of node ids
+        """
+        if self._components is not None:
+            return self._components
+
+        n = len(self)
+        offsets, targets = self.edge_offsets, self.edge_targets
+        index = array("i", [-1]) * n
+        low = array("i", [0]) * n
+        on_stack = bytearray(n)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            # (node, position of the next child to visit in edge_targets)
+            work = [(root, offsets[root])]
+            while work:
+                current, j = work[-1]
+                if j < offsets[current + 1]:
+                    work[-1] = (current, j + 1)
+                    child = targets[j]
+                    if index[child] == -1:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = 1
+                        work.append((child, offsets[child]))
+                    elif on_stack[child] and index[child] < low[current]:
+                        low[current] = index[child]
+                    continue
+
+                work.pop()
+                if work and low[current] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[current]
+                if low[current] == index[current]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == current:
+                            break
+                    components.append(component)
+
+        self._components = components
+        return components
+
+    def recursive_components(self) -> List[List[int]]:
+        """
+        Components with a dependency cycle: (mutually) recursive functions or import cycles
+        """
+        return [x for x in self.strongly_connected_components() if len(x) > 1 or x[0] in self.dependencies(x[0])]
+
+    def topological_order(self) -> List[int]:
+        """
+        Node ids ordered so that the dependencies of a node come before it.
+        Nodes of a dependency cycle (see recursive_components) are adjacent, in no particular order
+        """
+        return [x for component in self.strongly_connected_components() for x in component]
+
+
+def build_dependency_graph(modules: Union[Dict[str, ModuleNode], Iterable[ModuleNode], ModuleNode]) -> DependencyGraph:
+    """
+    Number the nodes of an extraction result and store their children as CSR arrays
+
+    Args:
+        modules: extracted modules, as returned by repo_extract, file_extract or iter_extract
+    """
+    nodes = []
+    node_ids = {}
+    queue = deque()
+    def visit(node) -> int:
+        key = node_key(node)
+        if key not in node_ids:
+            node_ids[key] = len(nodes)
+            nodes.append(node)
+            queue.append(node)
+        return node_ids[key]
+
+    for module_node in iter_module_nodes(modules):
+        for node in module_node.function_list + module_node.import_list:
+            visit(node)
+
+    # nodes are dequeued in the order of their ids
+    edge_offsets = array("I", [0])
+    edge_targets = array("I")
+    while queue:
+        node = queue.popleft()
+        for child in getattr(node, "children", []):
+            edge_targets.append(visit(child))
+        edge_offsets.append(len(edge_targets))
+    return DependencyGraph(edge_offsets, edge_targets, nodes, node_ids)
@@ -1,189 +1,604 @@
-import os
-from typing import List, Dict
-from codetext.parser import PythonParser
+import time
+import weakref
+import tree_sitter
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 
-from .build_repo_graph import get_repo_graph
-from .utils import get_root_node, get_node_by_kind, get_import_nodes
+from .build_repo_graph import get_repo_graph, get_identifiers
 from .Node import FunctionNode, ClassNode, BlockNode, ImportNode, ModuleNode
-from .constant import PY_EXTENSIONS, EXCLUDED_TYPING_IDENTIFIERS
-from .travel_graph import import_analyze
+from .constant import EXCLUDED_TYPING_IDENTIFIERS, ASYNC_MAX_CONCURRENCY
+from .travel_graph import resolve_imports
+from .utils import parse_import
+from .parse_cache import ParseCache, ParsedFile, point_at
+from .persistent_index import PersistentIndex
+from .module_index import ModuleIndex
+from .parallel import summarize_files, get_python_files, LINKING_METADATA, INDEX_METADATA
+from .dependency_graph import DependencyGraph, build_dependency_graph
+from .reverse_index import ReverseIndex, dependency_key
+from .scanner import RepoScanner
+from .instrumentation import Instrumentation, phase_timer
+from .budget import ExtractionBudget, node_size
 
 class Extractor:
-    def __init__(self, repo_src: str, module: str=None):
+    def __init__(self, repo_src: str, module: str=None, parse_cache: ParseCache=None, index_dir: str=None, workers: int=1, keep_trees: bool=False, lazy_graph: bool=False, include: List[str]=None, exclude: List[str]=None, use_gitignore: bool=True, instrumentation: Instrumentation=None, max_depth: int=None, max_nodes: int=None, max_bytes: int=None):
         self.repo_src = repo_src
         self.module = module
-        self.repo_graph = get_repo_graph(repo_src)
+        self.workers = workers
+        # Extracted nodes only keep byte ranges in the source of their file, the parsed trees
+        # are released after the extraction unless they are kept explicitly
+        self.keep_trees = keep_trees
+        # The same cache is shared by the repo graph, import resolution and dependency extraction
+        self.parse_cache = parse_cache if parse_cache is not None else ParseCache()
+        # Optional timers, counters and progress callback of the extraction (see Extractor.stats)
+        self.instrumentation = instrumentation
+        # Lazy repo graph: files are listed, their identifiers are only extracted when an import resolution reads them
+        self.lazy_graph = lazy_graph
+        # Bounded extraction: the dependencies of each module (or symbol) are expanded breadth-first
+        # up to max_depth hops, max_nodes nodes and max_bytes bytes of source (see ExtractionBudget)
+        self.budget = ExtractionBudget(max_depth, max_nodes, max_bytes)
+        if not self.budget.bounded:
+            self.budget = None
+        elif index_dir is not None:
+            raise ValueError("max_depth, max_nodes and max_bytes can not be used with index_dir, the index stores complete extractions")
+
+        # Folders are listed once for the repo graph, the module files and the index, skipping
+        # virtual environments, build folders, .gitignore'd paths and `exclude` globs
+        self.scanner = RepoScanner(repo_src, include, exclude, use_gitignore)
+
+        # Incremental mode: only the files changed since the last saved extraction are parsed again
+        self.index = None
+        known_identifiers = None
+        if index_dir is not None:
+            self.index = PersistentIndex(index_dir, repo_src)
+            self.index.refresh(self.scanner)
+            known_identifiers = self.index.known_identifiers()
+
+        # Parallel mode: the files are parsed by worker processes, which send back the local facts of each file
+        # (repo graph identifiers, definitions and statements with their byte ranges, parsed imports, function metadata).
+        # This process builds the nodes from these summaries without parsing the files, and links the dependencies
+        if self.workers > 1:
+            known_identifiers = known_identifiers or {}
+            paths = [x for x in get_python_files(repo_src, self.scanner) if x not in known_identifiers]
+            metadata = INDEX_METADATA if self.index is not None else LINKING_METADATA
+            for summary in summarize_files(paths, self.workers, metadata):
+                known_identifiers[summary["path"]] = {"path": summary["path"], "childrens": summary["identifiers"]}
+                if summary["digest"] is not None:
+                    self.parse_cache.add_summary(summary["digest"], summary["summary"])
+
+        # The repo graph is built on first use, always lazily for extract_symbol
+        self.known_identifiers = known_identifiers
+        self._repo_graph = None
+        self._module_index = None
+        # Dependents of the nodes, recorded while the dependencies of the last extraction are linked
+        self.reverse_index = ReverseIndex()
+        # Extracted nodes of the last extraction by type and path, updated by update_file
+        self.module_function_dict = None
+        if self.index is not None:
+            self.build_repo_graph(lazy= self.lazy_graph)
+
+    @property
+    def repo_graph(self) -> Dict:
+        if self._repo_graph is None:
+            self.build_repo_graph(lazy= self.lazy_graph)
+        return self._repo_graph
+
+    @property
+    def module_index(self) -> ModuleIndex:
+        if self._module_index is None:
+            self._module_index = ModuleIndex(self.repo_graph)
+        return self._module_index
+
+    def build_repo_graph(self, lazy: bool) -> None:
+        """
+        Build the repo graph of the repository. A lazy graph only lists the files,
+        their identifiers are extracted when an import resolution reads them (see LazyFileEntry)
+        """
+        with phase_timer(self.instrumentation, "repo_graph"):
+            self._repo_graph = get_repo_graph(self.repo_src, parse_cache= self.parse_cache, known_identifiers= self.known_identifiers, lazy= lazy, scanner= self.scanner)
+        self._module_index = None
+        if self.index is not None:
+            self.index.update_identifiers(self._repo_graph)
 
     def extract(self):
         if self.module is None:
-            return self.repo_extract()
+            output = self.repo_extract()
         else:
-            return self.file_extract()
+            output = self.file_extract()
+
+        if not self.keep_trees:
+            # Nodes parse their file again if their tree_sitter_node is read later
+            self.parse_cache.clear()
+        return output
+
+    async def extract_async(self, max_concurrency: int= ASYNC_MAX_CONCURRENCY):
+        """
+        Same output as extract without blocking the event loop: files are read concurrently
+        and the extraction runs on another thread (see AsyncExtractor)
+        """
+        from .async_extractor import AsyncExtractor
+        async with AsyncExtractor(self, max_concurrency) as async_extractor:
+            return await async_extractor.extract()
+
+    def extract_symbol(self, path: str, name: str) -> Optional[FunctionNode]:
+        """
+        Extract a function of a module file with its dependencies. If the repo graph is not built yet,
+        it is built lazily: only the module file and the files reached by the dependencies of the
+        function are parsed, instead of the whole repository
+
+        Args:
+            path: path of the module file
+            name: name of the function (not a method)
+
+        Return:
+            FunctionNode of the function, with its dependencies as children. None if the file does not define it
+        """
+        if self._repo_graph is None:
+            self.build_repo_graph(lazy= True)
+
+        parsed_file = self.parse_cache.get(path)
+        if parsed_file is None:
+            return None
+        function_nodes = [node for function_name, node in parsed_file.functions if function_name == name]
+        if not function_nodes:
+            return None
+
+        module_function_dict = self.init_module_function_dict()
+        target_function = build_function_node(path, function_nodes[0], parsed_file)
+        if self.budget is not None:
+            get_bounded_dependencies([target_function], module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation, self.budget)
+        else:
+            get_dependencies(target_function, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
+        if self.index is not None:
+            # the restored node of an unchanged function is returned
+            self.index.link(module_function_dict, self.reverse_index)
+
+        if not self.keep_trees:
+            self.parse_cache.clear()
+        return module_function_dict["function"][path][name]
+
+    def dependency_graph(self, output: Dict= None) -> DependencyGraph:
+        """
+        Integer dependency graph (see DependencyGraph) of an extraction output, extracted if it is not given
+        """
+        if output is None:
+            output = self.extract()
+        return build_dependency_graph(output)
+
+    def get_dependents(self, path: str, name: str, transitive: bool= False) -> Set[Tuple]:
+        """
+        Nodes depending on the function `name` of the file `path`, according to the last extraction
+        (extract or iter_extract)
+
+        Args:
+            path: path of the file defining the function
+            name: name of the function
+            transitive: also return the nodes depending on it through other nodes
+
+        Return:
+            keys of the dependent nodes, e.g. ("function", path, name) or ("import", path, content) (see dependency_key)
+        """
+        return self.reverse_index.get_dependents(("function", path, name), transitive)
+
+    def refresh(self, rebuild_graph: bool= True) -> Set[str]:
+        """
+        Look for the files changed since the last extraction, e.g. in a long-running process.
+        The repository is listed again and the next extraction only parses the changed files (index_dir is required)
+
+        Args:
+            rebuild_graph: build the repo graph again for the next extraction. False if the changed files
+                are updated with update_file instead, which updates their identifiers in the repo graph
+
+        Return:
+            files added, modified or removed since the last extraction (the files found by this call are in index.refreshed)
+        """
+        if self.index is None:
+            raise ValueError("refresh needs an index, set index_dir")
+        self.scanner = RepoScanner(self.repo_src, self.scanner.include, self.scanner.exclude, self.scanner.use_gitignore)
+        self.index.refresh(self.scanner)
+        if self.index.changed and rebuild_graph:
+            self.reset_repo_graph()
+        return set(self.index.changed)
+
+    def reset_repo_graph(self) -> None:
+        """
+        Build the repo graph again on next use: only the files changed since the index was saved are read
+        """
+        if self.index is not None:
+            self.known_identifiers = self.index.known_identifiers()
+        self._repo_graph = None
+        self._module_index = None
+
+    def update_file(self, path: str, content: str= None) -> Dict:
+        """
+        Update the last extraction after a module file changed, parsing it incrementally (see ParseCache.reparse).
+        Only the functions and import statements of the file intersecting the changed ranges are extracted again,
+        and the nodes depending on added, removed or changed definitions of the file are linked again.
+        Nodes are updated in place, so the output of the last extraction stays valid once the ModuleNode of the file
+        is replaced by the returned one. With keep_trees=True,
+        the tree of the previous content is reused and the files of the linked nodes are not parsed again.
+        The other files must not have changed since the last extraction, see update_files otherwise.
+        The index (index_dir) is not updated
+
+        Args:
+            path: path of the module file, as in the extraction
+            content: new content of the file (already written to it), read from the file if None
+
+        Return:
+            {"module": ModuleNode of the file,
+             "recomputed": functions and import statements of the file extracted again,
+             "removed": functions and import statements removed from the file,
+             "relinked": number of other nodes linked again,
+             "changed_ranges": changed byte ranges of the new content}
+        """
+        return self.update_files([path], None if content is None else [content])[0]
+
+    def update_files(self, paths: List[str], contents: List[str]= None) -> List[Dict]:
+        """
+        Update the last extraction after several module files changed (see update_file). The nodes of every
+        changed file are updated before any dependency is linked again, so that the files are only linked
+        with the new content of each other
+
+        Args:
+            paths: paths of the module files, as in the extraction
+            contents: new contents of the files, read from the files if None
+
+        Return:
+            output of update_file for each file, in the order of `paths`
+        """
+        module_function_dict = self.module_function_dict
+        if module_function_dict is None:
+            raise ValueError("update_file needs a previous extraction")
+        if self.budget is not None:
+            raise ValueError("update_file does not support max_depth, max_nodes or max_bytes")
+        if contents is None:
+            contents = [None] * len(paths)
+
+        updates = [self.update_file_nodes(path, content) for path, content in zip(paths, contents)]
+
+        relinked = {}
+        for update in updates:
+            relinked.update(update["relinked"])
+        for update in updates:
+            for key in update["dependents"]:
+                node = module_function_dict[key[0]].get(key[1], {}).get(key[2]) if key[0] in ["function", "import"] else None
+                if node is not None:
+                    relinked.setdefault(key, node)
+                    update["relinked"].setdefault(key, node)
+
+        for update in updates:
+            for node in update["added"]:
+                get_dependencies(node, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
+        for key, node in relinked.items():
+            # nodes removed by the update of another file are not linked again
+            if module_function_dict[key[0]].get(key[1], {}).get(key[2]) is node:
+                relink_dependencies(node, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
+
+        return [{"module": build_module_node(update["path"], module_function_dict),
+                 "recomputed": update["recomputed"],
+                 "removed": update["removed"],
+                 "relinked": len(update["relinked"].keys() - set(update["recomputed"])),
+                 "changed_ranges": update["changed_ranges"]} for update in updates]
+
+    def update_file_nodes(self, path: str, content: str= None) -> Dict:
+        """
+        First step of update_files for one file: reparse the file and update its nodes in place,
+        collecting the nodes to extract or link again
+
+        Return:
+            {"path", "recomputed", "removed", "changed_ranges",
+             "added": new nodes of the file to extract,
+             "relinked": key -> node to link again,
+             "dependents": keys of the nodes to link again, which may be removed by the update of another file}
+        """
+        module_function_dict = self.module_function_dict
+        if content is None:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+
+        # the nodes of the file are held by the extraction again (see iter_extract)
+        functions = module_function_dict["function"][path] = dict(module_function_dict["function"].get(path, {}))
+        imports = module_function_dict["import"][path] = dict(module_function_dict["import"].get(path, {}))
+        nodes = list(functions.values()) + list(imports.values())
+        previous_source = next((x.source_file.source for x in nodes if x.source_file is not None), None)
+        # the cached parse result is only reused if it is the one of the extracted nodes
+        previous = self.parse_cache.peek(path)
+        if previous is not None and (previous_source is None or bytes(previous.source) != bytes(previous_source)):
+            previous = None
+        parsed_file, changed_ranges = self.parse_cache.reparse(path, content, previous, previous_source)
+
+        def is_changed(node: tree_sitter.Node) -> bool:
+            return any(node.start_byte <= end and start <= node.end_byte for start, end in changed_ranges)
+
+        new_functions = {}
+        for name, node in parsed_file.functions:
+            new_functions.setdefault(name, node)
+        new_imports = {}
+        for node in parsed_file.imports:
+            new_imports.setdefault(node.text.decode(), node)
+
+        # names whose definitions in the file changed
+        changed_names = set(name for name, entries in parsed_file.symbol_table.symbols.items() if any(is_changed(x[4]) for x in entries))
+        recomputed, removed = [], []
+        relinked = {}
+        dependents = set()
+
+        for name, function in list(functions.items()):
+            key = ("function", path, name)
+            node = new_functions.get(name)
+            if node is None:
+                removed.append(key)
+                changed_names.add(name)
+                dependents |= self.reverse_index.get_dependents(key)
+                self.reverse_index.remove(key)
+                del functions[name]
+                continue
+
+            unchanged = function.source_file is not None and not is_changed(node) and \
+                bytes(function.source_file.source[function.start_byte:function.end_byte]) == parsed_file.source[node.start_byte:node.end_byte]
+            function.relocate(node, parsed_file.source_file)
+            if not unchanged:
+                function.reset_metadata()
+                recomputed.append(key)
+                relinked[key] = function
+            # the dependents hold this node, they do not need to be linked again
+            changed_names.discard(name)
+
+        for import_content, import_node in list(imports.items()):
+            key = ("import", path, import_content)
+            node = new_imports.get(import_content)
+            if node is None:
+                removed.append(key)
+                dependents |= self.reverse_index.get_dependents(key)
+                self.reverse_index.remove(key)
+                del imports[import_content]
+            else:
+                # same statement, same resolution
+                import_node.relocate(node, parsed_file.source_file)
+
+        # only the functions reached by dependencies are extracted in the other files of a module extraction
+        added = []
+        if self.module is None or self.module == path:
+            added = [build_function_node(path, node, parsed_file) for name, node in new_functions.items() if name not in functions]
+        added += [ImportNode(path, import_content, node, parsed_file.source_file) for import_content, node in new_imports.items() if import_content not in imports]
+        recomputed.extend(dependency_key(x) for x in added)
+
+        # functions of the file calling changed names
+        for name, function in functions.items():
+            if changed_names.intersection(function.called_identifiers):
+                relinked.setdefault(("function", path, name), function)
+
+        # class and block nodes of the file after the first change moved
+        first_change = point_at(parsed_file.source, min(start for start, _ in changed_ranges))
+        for key in [x for x in self.reverse_index.dependents if x[0] in ["class", "block"] and x[1] == path and x[2] >= first_change]:
+            dependents |= self.reverse_index.dependents[key]
+
+        # import statements resolved into the file (including its own, e.g. `from . import module`)
+        identifiers_changed = self.module_index.update_identifiers(path, get_identifiers(parsed_file.root_node))
+        if changed_names:
+            for other_path, other_imports in module_function_dict["import"].items():
+                for import_content, import_node in list(other_imports.items()):
+                    for import_info in import_node.import_dict:
+                        if (import_info["import_path"] == path and (import_info["name"] == "*" or import_info["import_file_or_folder"] or import_info["module"] in changed_names)) \
+                            or (identifiers_changed and import_info["module"].split(".")[-1] in changed_names):
+                            relinked.setdefault(("import", other_path, import_content), import_node)
+                            break
+
+        return {"path": path,
+                "recomputed": recomputed,
+                "removed": removed,
+                "changed_ranges": changed_ranges,
+                "added": added,
+                "relinked": relinked,
+                "dependents": dependents}
 
     def file_extract(self):
-        functions = get_functions_from_module_file(self.module)
-        import_nodes = get_import_from_module_file(self.module)
-        module_function_dict = {"function": {}, "import": {}}
-        module_node = ModuleNode(path= self.module)
-        
-        for function in functions:
-            get_dependencies(function, module_function_dict, self.repo_src, self.repo_graph)
-        
-        for import_node in import_nodes:
-            get_dependencies(import_node, module_function_dict, self.repo_src, self.repo_graph)
+        module_function_dict = self.init_module_function_dict()
 
-        if self.module in module_function_dict["function"]: # check no extracted functions
-            module_node.function_list.extend(sorted([module_function_dict["function"][self.module][x] for x in module_function_dict["function"][self.module]], key= lambda x: x.position_in_file[0][0]))
-        if self.module in module_function_dict["import"]: # check no extracted import
-            module_node.import_list.extend(sorted([module_function_dict["import"][self.module][x] for x in module_function_dict["import"][self.module]], key= lambda x: x.position_in_file[0][0]))
-        
-        return module_node
+        if self.index is None or self.index.is_dirty(self.module):
+            self.extract_module(self.module, module_function_dict)
+
+        if self.index is not None:
+            self.index.link(module_function_dict, self.reverse_index)
+            # identifiers extracted lazily during the extraction are saved too
+            self.index.update_identifiers(self.repo_graph)
+            self.index.save(module_function_dict, self.index.clean_modules() | {self.module})
+
+        return build_module_node(self.module, module_function_dict)
         
 
     def repo_extract(self):
-        all_modules = []
-        get_modules_from_repo(self.repo_src, all_modules)
-        module_function_dict = {"function": {}, "import": {}}
         module_dict = {}
+        # the output references every node, so none of them is freed or extracted twice
+        for module_node in self.iter_extract():
+            module_dict[module_node.path] = module_node
+        return module_dict
 
-        for module in all_modules:
-            functions = get_functions_from_module_file(module)
-            import_nodes = get_import_from_module_file(module)
-            module_dict[module] = ModuleNode(path= module)
+    def iter_extract(self) -> Iterator[ModuleNode]:
+        """
+        Extract the module files of the repository one by one, yielding the ModuleNode of a module
+        as soon as its functions and imports are resolved. Modules are yielded in the order of repo_extract.
 
+        The extraction only keeps weak references to the nodes of the yielded modules: they are freed once
+        nothing else references them, and extracted again if a later module depends on them.
+        With an index (index_dir), the modules are yielded once the whole repository is extracted and linked
+        """
+        all_modules = []
+        with phase_timer(self.instrumentation, "scan"):
+            get_modules_from_repo(self.repo_src, all_modules, self.scanner)
+        with phase_timer(self.instrumentation, "index_restore"):
+            module_function_dict = self.init_module_function_dict()
+
+        try:
+            if self.index is not None:
+                for i, module in enumerate(all_modules):
+                    if self.index.is_dirty(module):
+                        self.extract_module(module, module_function_dict)
+                    self.report_progress(module, i, len(all_modules))
+                with phase_timer(self.instrumentation, "index_save"):
+                    self.index.link(module_function_dict, self.reverse_index)
+                    # identifiers extracted lazily during the extraction are saved too
+                    self.index.update_identifiers(self.repo_graph)
+                    self.index.save(module_function_dict, set(all_modules))
+
+                for module in all_modules:
+                    yield build_module_node(module, module_function_dict)
+                return
+
+            for i, module in enumerate(all_modules):
+                self.extract_module(module, module_function_dict)
+                self.report_progress(module, i, len(all_modules))
+                module_node = build_module_node(module, module_function_dict)
+                for node_type in ["function", "import"]:
+                    if module in module_function_dict[node_type]:
+                        module_function_dict[node_type][module] = weakref.WeakValueDictionary(module_function_dict[node_type][module])
+                yield module_node
+        finally:
+            if not self.keep_trees:
+                self.parse_cache.clear()
+
+    def init_module_function_dict(self) -> Dict:
+        """
+        Get the initial module_function_dict: empty, or restored from the index
+        with the stale import statements extracted again. The reverse index is reset
+        """
+        self.reverse_index = ReverseIndex()
+        if self.index is None:
+            self.module_function_dict = {"function": {}, "import": {}}
+            return self.module_function_dict
+
+        module_function_dict, stale_imports = self.index.restore()
+        self.module_function_dict = module_function_dict
+        for path, stale_contents in stale_imports.items():
+            for import_node in get_import_from_module_file(path, self.parse_cache):
+                if import_node.content in stale_contents:
+                    get_dependencies(import_node, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
+        return module_function_dict
+
+    def extract_module(self, module: str, module_function_dict: Dict) -> None:
+        start = time.perf_counter()
+        functions = get_functions_from_module_file(module, self.parse_cache)
+        import_nodes = get_import_from_module_file(module, self.parse_cache)
+
+        if self.budget is not None:
+            # the budget applies to each module, the nodes extracted for the previous modules are linked for free
+            get_bounded_dependencies(functions + import_nodes, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation, self.budget)
+        else:
             for function in functions:
-                get_dependencies(function, module_function_dict, self.repo_src, self.repo_graph)
+                get_dependencies(function, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
 
             for import_node in import_nodes:
-                get_dependencies(import_node, module_function_dict, self.repo_src, self.repo_graph)
-
-            if module in module_function_dict["function"]:
-                module_dict[module].function_list.extend(sorted([module_function_dict["function"][module][x] for x in module_function_dict["function"][module]], key= lambda x: x.position_in_file[0][0]))
-            if module in module_function_dict["import"]:
-                module_dict[module].import_list.extend(sorted([module_function_dict["import"][module][x] for x in module_function_dict["import"][module]], key= lambda x: x.position_in_file[0][0]))
-        return module_dict
-
-def get_modules_from_repo(repo_src: str, modules: List=[]) -> List[str]:
+                get_dependencies(import_node, module_function_dict, self.repo_src, self.repo_graph, self.parse_cache, self.module_index, self.reverse_index, self.instrumentation)
+
+        if self.instrumentation is not None:
+            seconds = time.perf_counter() - start
+            self.instrumentation.add_time("extract_module", seconds)
+            self.instrumentation.record_file(module, seconds)
+
+    def report_progress(self, module: str, index: int, total: int) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.progress("module", path= module, done= index + 1, total= total)
+
+    def stats(self, slowest: int= 10) -> Dict:
+        """
+        Counters of the extraction: parse cache (files read, parses, cache hits, stat calls, read and parse time),
+        import resolution, and with instrumentation the phase timers, nodes built, `slowest` slowest module files
+        and the exceptions swallowed while extracting dependencies
+        """
+        stats = {"parse_cache": self.parse_cache.stats(),
+                 "module_index": self._module_index.stats() if self._module_index is not None else None}
+        if self.instrumentation is not None:
+            stats.update(self.instrumentation.report(slowest))
+        return stats
+
+def build_module_node(module: str, module_function_dict: Dict) -> ModuleNode:
+    """
+    Build the ModuleNode of a module from its extracted functions and import statements, in file order
+    """
+    module_node = ModuleNode(path= module)
+    if module in module_function_dict["function"]: # check no extracted functions
+        module_node.function_list.extend(sorted(module_function_dict["function"][module].values(), key= lambda x: x.position_in_file[0][0]))
+    if module in module_function_dict["import"]: # check no extracted import
+        module_node.import_list.extend(sorted(module_function_dict["import"][module].values(), key= lambda x: x.position_in_file[0][0]))
+    return module_node
+
+def get_modules_from_repo(repo_src: str, modules: List=[], scanner: RepoScanner=None) -> List[str]:
     """
     Get all module files from a repository
 
     Args:
         repo_src: local path of the repository
         modules: list of extracted modules
+        scanner: lists the folders of the repository (see RepoScanner), shared with the repo graph
     """
-    
-    IGNORE_MODULES = (".git", "__pycache__")
-    for sub_f in os.listdir(repo_src):
-        if sub_f.startswith(IGNORE_MODULES):
-            continue
-        if os.path.isdir(os.path.join(repo_src, sub_f)):
-            get_modules_from_repo(os.path.join(repo_src, sub_f), modules)
-        
-        for py_ext in PY_EXTENSIONS:
-            if sub_f.endswith(py_ext) and not sub_f.startswith("__init__"):
-                modules.append(os.path.join(repo_src, sub_f))
-                break
+    if scanner is None:
+        scanner = RepoScanner(repo_src)
 
-def get_functions_from_module_file(module_path: str) -> List:
+    for sub_f, path, is_dir in scanner.entries(repo_src):
+        if is_dir:
+            get_modules_from_repo(path, modules, scanner)
+        elif not sub_f.startswith("__init__"):
+            modules.append(path)
+
+def get_functions_from_module_file(module_path: str, parse_cache: ParseCache=None) -> List:
     extracted_functions = []
+    if parse_cache is None:
+        parse_cache = ParseCache()
 
     # Read module file
-    try:
-        with open(module_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
-    except:
-        return []
-
-    root_node = get_root_node(file_content)
-
-    function_nodes = get_node_by_kind(root_node, kind= ["function_definition"], ignore_kind=["class_definition"], avoid_nested= True)
-    if len(function_nodes) == 0:
+    parsed_file = parse_cache.get(module_path)
+    if parsed_file is None:
         return []
 
-    for function_node in function_nodes:
-        extracted_functions.append(FunctionNode(module_path, function_node.text.decode(), function_node))
+    for _, function_node in parsed_file.functions:
+        extracted_functions.append(build_function_node(module_path, function_node, parsed_file))
 
     return extracted_functions
 
-def get_import_from_module_file(module_path: str) -> List:
+def build_function_node(path: str, function_node: tree_sitter.Node, parsed_file: ParsedFile) -> FunctionNode:
+    # Reuse the metadata precomputed by worker processes if any
+    metadata = parsed_file.function_metadata.get((function_node.start_byte, function_node.end_byte))
+    return FunctionNode(path, None, function_node, metadata, parsed_file.source_file)
+
+def get_import_from_module_file(module_path: str, parse_cache: ParseCache=None) -> List:
     extracted_import = []
+    if parse_cache is None:
+        parse_cache = ParseCache()
 
     # Read module file
-    try:
-        with open(module_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
-    except:
-        return []
-
-    import_nodes = get_import_nodes(file_content)
-    if len(import_nodes) == 0:
+    parsed_file = parse_cache.get(module_path)
+    if parsed_file is None:
         return []
 
-    for import_node in import_nodes:
-        extracted_import.append(ImportNode(module_path, import_node.text.decode(), import_node))
+    for import_node in parsed_file.imports:
+        extracted_import.append(ImportNode(module_path, import_node.text.decode(), import_node, parsed_file.source_file))
 
     return extracted_import
 
 
-def get_function_dependencies(target_function: FunctionNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict) -> FunctionNode:
+def get_function_dependencies(target_function: FunctionNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache=None, module_index: ModuleIndex=None, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None, budget: ExtractionBudget=None, pending: List=None) -> FunctionNode:
     
     local_path = target_function.path
+    if parse_cache is None:
+        parse_cache = ParseCache()
+
     # Read module file
-    try:
-        with open(local_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
-    except:
+    parsed_file = parse_cache.get(local_path)
+    if parsed_file is None:
         return []
 
-    root_node = get_root_node(file_content)
-
-    # Obtain blocks that are function 
-    for node in get_node_by_kind(root_node, kind= ["function_definition"], ignore_kind=["class_definition"], avoid_nested= True):
-        iden_name = PythonParser.get_function_metadata(node, file_content)["identifier"]
-        if iden_name in target_function.called_identifiers:
-            if iden_name not in module_function_dict["function"][local_path]:
-                dep_function = FunctionNode(local_path, node.text.decode(), node)
-                get_dependencies(dep_function, module_function_dict, repo_src, repo_graph)
-            target_function.children.append(module_function_dict["function"][local_path][iden_name])
-    
-    # Obtain blocks that are class 
-    for node in get_node_by_kind(root_node, kind= ["class_definition"], ignore_kind=["function_definition"], avoid_nested= True):
-        iden_name = PythonParser.get_function_metadata(node, file_content)["identifier"]
-        if iden_name in target_function.called_identifiers:
-            """
-            TODO: update dependencies for class object
-            # if iden_name not in module_function_dict[local_path]:
-            #     dep_class = ClassNode(local_path, node.text.decode(), node)
-            #     module_function_dict[local_path][iden_name] = get_dependencies(dep_function, module_function_dict)
-            """
-            target_function.children.append(ClassNode(local_path, node.text.decode(), node))
-
-    # Obtain blocks that are variables, import, ...
-    # Do we need to consider decorated_definition @ ?
-    for node in root_node.children:
-        if node.type in ["function_definition", "class_definition", "decorated_definition"]: # already consider function and class definition
-            continue
-        if "import" in node.type:
-            node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind=["dotted_name"])]
-            if "*" in node_identifiers or len(set(node_identifiers).intersection(set(target_function.called_identifiers))) > 0:
-                if local_path not in module_function_dict["import"]:
-                    module_function_dict["import"][local_path] = {}
-                
-                if node.text.decode() not in module_function_dict["import"][local_path]:
-                    dep_import = ImportNode(local_path, node.text.decode(), node)
-                    get_dependencies(dep_import, module_function_dict, repo_src, repo_graph)
-                target_function.children.append(module_function_dict["import"][local_path][node.text.decode()])
-        # only consider the first identifier
-        # only consider "expression_statement" ?
-        elif node.type in ["expression_statement"]:
-            node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind=["identifier"])]
-            if node_identifiers and node_identifiers[0] in target_function.called_identifiers and node_identifiers[0] not in EXCLUDED_TYPING_IDENTIFIERS: # avoid achieving redundant context with typing identifiers
-                target_function.children.append(BlockNode(local_path, node.text.decode(), node))
+    # Obtain functions, classes and blocks (variables, import, ...) that are called
+    # avoid achieving redundant context with typing identifiers
+    called_identifiers = set(target_function.called_identifiers)
+    for _, _, kind, iden_name, node in parsed_file.symbol_table.select(called_identifiers, excluded_blocks= EXCLUDED_TYPING_IDENTIFIERS):
+        link_dependency(target_function, kind, iden_name, node, local_path, parsed_file, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, budget, pending)
 
     return target_function    
 
-def get_import_dependencies(target_import: ImportNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict) -> ImportNode:
-    target_import.import_dict = import_analyze([target_import.tree_sitter_node], target_import.path, repo_graph)
+def get_import_dependencies(target_import: ImportNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache=None, module_index: ModuleIndex=None, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None, budget: ExtractionBudget=None, pending: List=None) -> ImportNode:
+    if parse_cache is None:
+        parse_cache = ParseCache()
+
+    with phase_timer(instrumentation, "import_analyze"):
+        target_import.import_dict = resolve_imports(get_import_details(target_import, parse_cache), target_import.path, repo_graph, parse_cache, module_index)
     import_dict = [x for x in target_import.import_dict if x["import_path"] and x["import_path"].startswith(repo_src)]
     
     # third party import or import that are failed to obtain path
@@ -194,71 +609,223 @@ def get_import_dependencies(target_import: ImportNode, module_function_dict: Dic
     selected_file = {}
     for import_info in import_dict:
         if import_info["import_path"] not in selected_file:
-            selected_file[import_info["import_path"]] = []
+            selected_file[import_info["import_path"]] = set()
         if import_info["name"] == "*" or import_info["import_file_or_folder"]:
-            selected_file[import_info["import_path"]].append("*")
+            selected_file[import_info["import_path"]].add("*")
         else:
-            selected_file[import_info["import_path"]].append(import_info["module"])
+            selected_file[import_info["import_path"]].add(import_info["module"])
     
-    for fid, import_file in enumerate(selected_file):
+    for import_file, selected_names in selected_file.items():
+        # Sometime the import_path extracted is a directory. We ignore this case now :(
+        parsed_file = parse_cache.get(import_file)
+        if parsed_file is None:
+            continue
+
+        # Obtain functions, classes and blocks (variables, import, ...) that are imported
+        for _, _, kind, iden_name, node in parsed_file.symbol_table.select(selected_names, wildcard= "*" in selected_names):
+            link_dependency(target_import, kind, iden_name, node, import_file, parsed_file, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, budget, pending)
+    return target_import
+
+def get_import_details(target_import: ImportNode, parse_cache: ParseCache) -> List[Dict]:
+    """
+    Parsed imports of an import statement (see parse_import), precomputed by a worker process if any (see ParsedFile.summary)
+    """
+    parsed_file = parse_cache.peek(target_import.path)
+    if target_import.source_file is not None and parsed_file is not None and parsed_file.source_file is target_import.source_file:
+        import_details = parsed_file.import_details.get((target_import.start_byte, target_import.end_byte))
+        if import_details is not None:
+            # the resolution is added to the parsed imports
+            return [dict(x) for x in import_details]
+    return parse_import(target_import.tree_sitter_node)
+
+def link_dependency(target_node: FunctionNode | ImportNode, kind: str, iden_name: str, node: tree_sitter.Node, path: str, parsed_file: ParsedFile, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache, module_index: ModuleIndex, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None, budget: ExtractionBudget=None, pending: List=None) -> None:
+    """
+    Append a symbol table entry of the file `path` to the children of `target_node`,
+    extracting the dependencies of the entry if it is not extracted yet (queued in `pending` if any, see expand_dependencies).
+    The edge is also recorded in the reverse index if any.
+    With a budget, the dependencies of a new entry are queued instead (see get_bounded_dependencies),
+    and an entry which does not fit in the budget is not linked: `target_node` is marked truncated
+    """
+    if kind == "function":
+        if path not in module_function_dict["function"]:
+            module_function_dict["function"][path] = {}
+
+        # nodes of yielded modules are weakly referenced (see iter_extract), keep the node while linking it
+        dep_function = module_function_dict["function"][path].get(iden_name)
+        if dep_function is None:
+            dep_function = build_function_node(path, node, parsed_file)
+            if budget is None:
+                get_dependencies(dep_function, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, pending)
+        if budget is not None and not admit_dependency(dep_function, budget.depth + 1, module_function_dict, budget, instrumentation):
+            mark_truncated(target_node, instrumentation)
+            return
+        dependency = dep_function
+    elif kind == "class":
+        """
+        TODO: update dependencies for class object
+        # if iden_name not in module_function_dict[local_path]:
+        #     dep_class = ClassNode(local_path, node.text.decode(), node)
+        #     module_function_dict[local_path][iden_name] = get_dependencies(dep_function, module_function_dict)
+        """
+        dependency = ClassNode(path, None, node, parsed_file.source_file)
+    elif kind == "import":
+        if path not in module_function_dict["import"]:
+            module_function_dict["import"][path] = {}
+
+        dep_import = module_function_dict["import"][path].get(iden_name)
+        if dep_import is None:
+            dep_import = ImportNode(path, iden_name, node, parsed_file.source_file)
+            if budget is None:
+                get_dependencies(dep_import, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, pending)
+        if budget is not None and not admit_dependency(dep_import, budget.depth + 1, module_function_dict, budget, instrumentation):
+            mark_truncated(target_node, instrumentation)
+            return
+        dependency = dep_import
+    elif kind == "block":
+        dependency = BlockNode(path, None, node, parsed_file.source_file)
+    else:
+        return
+
+    if budget is not None and kind in ["class", "block"] and not budget.charge(dependency_key(dependency), node_size(dependency)):
+        mark_truncated(target_node, instrumentation)
+        return
+
+    target_node.children.append(dependency)
+    if reverse_index is not None:
+        reverse_index.add(target_node, dependency)
+    if instrumentation is not None:
+        instrumentation.count("links")
+        if kind in ["class", "block"]:
+            instrumentation.count(kind + "_nodes")
+
+
+def relink_dependencies(target_node: FunctionNode | ImportNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache=None, module_index: ModuleIndex=None, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None) -> None:
+    """
+    Extract the dependencies of an already extracted node again, e.g. after a file it depends on changed
+    (see Extractor.update_file). Its previous edges are removed from the reverse index
+    """
+    if parse_cache is None:
+        parse_cache = ParseCache()
+    if reverse_index is not None:
+        reverse_index.remove(dependency_key(target_node))
+    target_node.children = []
+    if target_node.tree_sitter_node is None:
+        locate_restored_node(target_node, parse_cache)
+    expand_dependencies([target_node], module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation)
+
+
+def expand_dependencies(pending: List, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache, module_index: ModuleIndex=None, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None) -> None:
+    """
+    Extract the dependencies of the registered nodes of `pending`, and of the new nodes they reach.
+    New nodes are pushed on `pending` instead of being extracted recursively, so that long call chains
+    do not overflow the stack
+    """
+    while pending:
+        node = pending.pop()
         try:
-            # Sometime the import_path extracted is a directory. We ignore this case now :(
-            with open(import_file, "r", encoding="utf-8") as f:
-                cross_file_content = f.read()
-        except:
+            if type(node) is FunctionNode:
+                get_function_dependencies(node, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, pending= pending)
+            else:
+                get_import_dependencies(node, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, pending= pending)
+        except Exception as e:
+            # The node keeps the dependencies linked so far, the failure is only counted
+            if instrumentation is not None:
+                instrumentation.record_exception(node, e)
+
+
+def get_bounded_dependencies(roots: List, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache, module_index: ModuleIndex, reverse_index: ReverseIndex, instrumentation: Instrumentation, budget: ExtractionBudget) -> None:
+    """
+    Extract the dependencies of root nodes (functions and import statements) within the bounds of `budget`.
+    Nodes are expanded breadth-first, functions before import statements at the same depth, so that the nearest
+    dependencies are extracted first. The nodes which are not expanded (beyond max_depth, or once the budget is spent)
+    or whose dependencies do not all fit are marked truncated. A truncated node reached again is expanded again
+    """
+    budget.reset()
+    for root in roots:
+        admit_dependency(root, 0, module_function_dict, budget, instrumentation, force= True)
+
+    while True:
+        item = budget.pop()
+        if item is None:
+            break
+        depth, key, node = item
+        if not budget.can_expand(depth):
+            mark_truncated(node, instrumentation)
             continue
+        if node.truncated:
+            if reverse_index is not None:
+                reverse_index.remove(key)
+            node.children = []
+            node.truncated = False
 
-        root_node = get_root_node(cross_file_content)
+        budget.depth = depth
+        try:
+            if key[0] == "function":
+                get_function_dependencies(node, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, budget)
+            else:
+                get_import_dependencies(node, module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation, budget)
+        except Exception as e:
+            if instrumentation is not None:
+                instrumentation.record_exception(node, e)
 
-        # Obtain blocks that are function 
-        for node in get_node_by_kind(root_node, kind= ["function_definition"], ignore_kind=["class_definition"], avoid_nested= True):
-            iden_name = PythonParser.get_function_metadata(node)["identifier"]
-            if "*" in selected_file[import_file] or iden_name in selected_file[import_file]:
-                if import_file not in module_function_dict["function"]:
-                    module_function_dict["function"][import_file] = {}
 
-                if iden_name not in module_function_dict["function"][import_file]:
-                    dep_function = FunctionNode(import_file, node.text.decode(), node)
-                    get_dependencies(dep_function, module_function_dict, repo_src, repo_graph)
-                target_import.children.append(module_function_dict["function"][import_file][iden_name])
-        
-        # Obtain blocks that are class 
-        for node in get_node_by_kind(root_node, kind= ["class_definition"], ignore_kind=["function_definition"], avoid_nested= True):
-            iden_name = PythonParser.get_function_metadata(node)["identifier"]
-            if "*" in selected_file[import_file] or iden_name in selected_file[import_file]:
-                """
-                TODO: update dependencies for class object
-                # if iden_name not in module_function_dict[local_path]:
-                #     dep_class = ClassNode(local_path, node.text.decode(), node)
-                #     module_function_dict[local_path][iden_name] = get_dependencies(dep_function, module_function_dict)
-                """
-                target_import.children.append(ClassNode(import_file, node.text.decode(), node))
-            
-        # Obtain blocks that are variables, ...
-        # Do we need to consider decorated_definition @ ?
-        for node in root_node.children:
-            if node.type in ["function_definition", "class_definition", "decorated_definition"]:# or "import" in node.type: # already consider function and class definition
-                continue
-            
-            if "import" in node.type:
-                node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind=["dotted_name"])]
-                if "*" in selected_file[import_file] or len(set(node_identifiers).intersection(set(selected_file[import_file]))) > 0:
-                    if import_file not in module_function_dict["import"]:
-                        module_function_dict["import"][import_file] = {}
-                    
-                    if node.text.decode() not in module_function_dict["import"][import_file]:
-                        dep_import = ImportNode(import_file, node.text.decode(), node)
-                        get_dependencies(dep_import, module_function_dict, repo_src, repo_graph)
-                    target_import.children.append(module_function_dict["import"][import_file][node.text.decode()])
-            elif node.type in ["expression_statement"]:
-                node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind= ["identifier"])]
-                if node_identifiers and node_identifiers[0] in selected_file[import_file]:
-                    target_import.children.append(BlockNode(import_file, node.text.decode(), node))
-    return target_import
+def admit_dependency(node: FunctionNode | ImportNode, depth: int, module_function_dict: Dict, budget: ExtractionBudget, instrumentation: Instrumentation=None, force: bool=False) -> bool:
+    """
+    Register a node of a bounded extraction and queue its expansion, if it fits in the budget.
+    A node already extracted is only queued if it is truncated
+
+    Args:
+        node: function or import node
+        depth: number of hops from the roots
+        force: register it even if it does not fit (roots)
 
+    Return:
+        False if the node does not fit in the budget
+    """
+    key = dependency_key(node)
+    nodes = module_function_dict[key[0]].setdefault(node.path, {})
+    registered = nodes.get(key[2])
+    if registered is not None:
+        if registered.truncated:
+            budget.push(registered, key, depth)
+        return True
+
+    if not budget.charge(key, node_size(node), force):
+        return False
+    nodes[key[2]] = node
+    if instrumentation is not None:
+        instrumentation.count(key[0] + "_nodes")
+    budget.push(node, key, depth)
+    return True
+
+
+def mark_truncated(node: FunctionNode | ImportNode, instrumentation: Instrumentation=None) -> None:
+    if not node.truncated:
+        node.truncated = True
+        if instrumentation is not None:
+            instrumentation.count("truncated_nodes")
+
+
+def locate_restored_node(target_node: FunctionNode | ImportNode, parse_cache: ParseCache) -> None:
+    """
+    Point a node restored from an index (without tree-sitter node) to its definition in the current source of its file
+    """
+    parsed_file = parse_cache.get(target_node.path)
+    if parsed_file is None:
+        return
+    if type(target_node) is FunctionNode:
+        nodes = [node for name, node in parsed_file.functions if name == target_node.name]
+    else:
+        nodes = [node for node in parsed_file.imports if node.text.decode() == target_node.content]
+    if nodes:
+        target_node.relocate(nodes[0], parsed_file.source_file)
 
-def get_dependencies(target_node: FunctionNode | ImportNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict):
 
+def get_dependencies(target_node: FunctionNode | ImportNode, module_function_dict: Dict, repo_src: str, repo_graph: Dict, parse_cache: ParseCache=None, module_index: ModuleIndex=None, reverse_index: ReverseIndex=None, instrumentation: Instrumentation=None, pending: List=None):
+    """
+    Register a function or import node and extract its dependencies, unless a node with the same key
+    is already registered. With `pending`, the node is only queued there (see expand_dependencies)
+    """
     target_node_type = None
     if type(target_node) is FunctionNode:
         target_node_type = "function"
@@ -278,18 +845,20 @@ def get_dependencies(target_node: FunctionNode | ImportNode, module_function_dic
         if target_node.content in module_function_dict[target_node_type][target_node.path]:
             return 
     
-    try:
-        # Some functions are recursive functions which can call forever
-        # Break when reach max recursion => the tree could be very large
-        if target_node_type == "function":
-            target_node = get_function_dependencies(target_node, module_function_dict, repo_src, repo_graph)
-        elif target_node_type == "import":
-            target_node = get_import_dependencies(target_node, module_function_dict, repo_src, repo_graph)
-    except Exception as e:
-        # print(e)
-        pass
+    if parse_cache is None:
+        parse_cache = ParseCache()
 
+    # Register the node before extracting its dependencies: recursive functions (or import cycles)
+    # are then linked to this node instead of being extracted again until max recursion,
+    # so the result does not depend on the recursion depth
     if target_node_type == "import":
         module_function_dict[target_node_type][target_node.path][target_node.content] = target_node
     elif target_node_type == "function":
-        module_function_dict[target_node_type][target_node.path][target_node.name] = target_node
\ No newline at end of file
+        module_function_dict[target_node_type][target_node.path][target_node.name] = target_node
+    if instrumentation is not None:
+        instrumentation.count(target_node_type + "_nodes")
+
+    if pending is not None:
+        pending.append(target_node)
+    else:
+        expand_dependencies([target_node], module_function_dict, repo_src, repo_graph, parse_cache, module_index, reverse_index, instrumentation)
@@ -0,0 +1,83 @@
+import time
+import traceback
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Tuple
+
+
+class Instrumentation:
+    """
+    Timers, counters and swallowed failures of an extraction, with an optional progress callback
+
+    Attributes:
+        timers (dict): phase -> [total seconds, number of calls]
+        counters (dict): name -> count (e.g. nodes built by type, swallowed exceptions)
+        file_times (dict): module path -> seconds spent extracting it (with the dependencies it extracted)
+        exception_counts (dict): path -> number of exceptions swallowed while extracting its nodes
+        exceptions (list): first `max_exceptions` swallowed exceptions: {"path", "node", "error", "location"}
+        callback (callable): called with each progress event, a dict {"event", ...}
+    """
+    def __init__(self, callback: Callable[[Dict], None]= None, max_exceptions: int= 1000):
+        self.callback = callback
+        self.max_exceptions = max_exceptions
+        self.timers: Dict[str, List] = {}
+        self.counters: Dict[str, int] = {}
+        self.file_times: Dict[str, float] = {}
+        self.exception_counts: Dict[str, int] = {}
+        self.exceptions: List[Dict] = []
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        timer = self.timers.setdefault(phase, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+    def count(self, name: str, n: int= 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_file(self, path: str, seconds: float) -> None:
+        self.file_times[path] = self.file_times.get(path, 0.0) + seconds
+
+    def record_exception(self, node, error: Exception) -> None:
+        """
+        Record an exception swallowed while extracting the dependencies of `node`
+        """
+        self.count("exceptions_swallowed")
+        self.exception_counts[node.path] = self.exception_counts.get(node.path, 0) + 1
+        if len(self.exceptions) < self.max_exceptions:
+            frames = traceback.extract_tb(error.__traceback__)
+            location = "{}:{} in {}".format(frames[-1].filename, frames[-1].lineno, frames[-1].name) if frames else None
+            self.exceptions.append({"path": node.path,
+                                    "node": getattr(node, "name", None) or node.content,
+                                    "error": repr(error),
+                                    "location": location})
+
+    def progress(self, event: str, **info) -> None:
+        if self.callback is not None:
+            info["event"] = event
+            self.callback(info)
+
+    def slowest_files(self, n: int= 10) -> List[Tuple[str, float]]:
+        return sorted(self.file_times.items(), key= lambda x: x[1], reverse= True)[:n]
+
+    def report(self, slowest: int= 10) -> Dict:
+        return {"timers": {phase: {"seconds": round(seconds, 6), "calls": calls} for phase, (seconds, calls) in self.timers.items()},
+                "counters": dict(self.counters),
+                "slowest_files": [{"path": path, "seconds": round(seconds, 6)} for path, seconds in self.slowest_files(slowest)],
+                "exceptions_by_file": dict(sorted(self.exception_counts.items(), key= lambda x: x[1], reverse= True)),
+                "exceptions": list(self.exceptions)}
+
+
+def phase_timer(instrumentation: Instrumentation, phase: str):
+    """
+    Timer of a phase, which does nothing without instrumentation
+    """
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.timer(phase)
@@ -0,0 +1,190 @@
+import os
+import stat
+from typing import Dict, List, Optional, Set, Tuple
+
+from .build_repo_graph import is_file_entry
+from .constant import PY_EXTENSIONS
+
+
+class ModuleIndex:
+    """
+    Flat index of a repo graph (see get_repo_graph) to resolve absolute imports with dict lookups.
+    It gives the same results as search_by_repo_graph without walking the whole graph for each import.
+    It also caches the import resolutions of the run (see import_analyze)
+
+    Attributes:
+        tracks (dict): module name -> graph entries (folder or file) with that name, which are not inside
+            an entry of the same name, in graph order. These are the starting points of a dotted path
+        files (dict): file path -> graph entry of the file
+        members (dict): file path -> set of identifiers in the file, filled on first use (see file_members)
+        exports (dict): package (folder) path -> path of its __init__.py
+        resolved (dict): (package, module) of an absolute import -> resolved (import_path, import_file_or_folder)
+        resolution_cache (dict): (importing directory, package, module) -> resolved (import_path, import_file_or_folder)
+        hits (int): number of imports served from resolution_cache
+        misses (int): number of imports resolved from scratch
+        stat_calls (int): number of file system calls to check the existence of a path
+    """
+    def __init__(self, repo_graph: Dict):
+        self.repo_graph = repo_graph
+        self.tracks: Dict[str, List[Dict]] = {}
+        self.files: Dict[str, Dict] = {}
+        self.members: Dict[str, Set[str]] = {}
+        self.exports: Dict[str, str] = {}
+        self.resolved: Dict[Tuple[Optional[str], str], Tuple] = {}
+
+        self.resolution_cache: Dict[Tuple[str, Optional[str], str], Tuple] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stat_calls = 0
+        self._path_facts: Dict[str, Tuple[bool, bool]] = {}
+        self._file_identifiers: Dict[str, Set[str]] = {}
+
+        self.index_children(repo_graph, frozenset())
+
+    def index_children(self, graph: Dict, ancestor_names: frozenset) -> None:
+        for child, child_graph in graph["childrens"].items():
+            # identifiers of the files are not read here, a lazy repo graph only extracts the ones used
+            if is_file_entry(child_graph):
+                self.files[child_graph["path"]] = child_graph
+                if child == "__init__.py":
+                    self.exports[graph["path"]] = child_graph["path"]
+
+            # "abc", "abc.py", "abc.pyi", ... are all reached by the name "abc"
+            names = {child}
+            for py_ext in PY_EXTENSIONS:
+                if child.endswith(py_ext):
+                    names.add(child[:-len(py_ext)])
+            for name in names - ancestor_names:
+                self.tracks.setdefault(name, []).append(child_graph)
+
+            if not is_file_entry(child_graph):
+                self.index_children(child_graph, ancestor_names | names)
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "stat_calls": self.stat_calls,
+                "cached_paths": len(self._path_facts),
+                "cached_identifier_sets": len(self._file_identifiers)}
+
+    def path_facts(self, path: str) -> Tuple[bool, bool]:
+        """
+        Whether a path exists and whether it is a directory, with one stat call per path in the run
+        """
+        if path not in self._path_facts:
+            self.stat_calls += 1
+            try:
+                mode = os.stat(path).st_mode
+                self._path_facts[path] = (True, stat.S_ISDIR(mode))
+            except (OSError, ValueError):
+                self._path_facts[path] = (False, False)
+        return self._path_facts[path]
+
+    def exists(self, path: str) -> bool:
+        return self.path_facts(path)[0]
+
+    def isdir(self, path: str) -> bool:
+        return self.path_facts(path)[1]
+
+    def file_members(self, path: str) -> Set[str]:
+        """
+        Identifiers of a file of the repo graph (see get_identifier_in_file)
+        """
+        if path not in self.members:
+            self.members[path] = set(self.files[path]["childrens"])
+        return self.members[path]
+
+    def update_identifiers(self, path: str, identifiers: List[str]) -> bool:
+        """
+        Replace the identifiers of a changed file of the repo graph. The import resolutions of the run are forgotten
+
+        Return:
+            whether the identifiers changed
+        """
+        self.members.pop(path, None)
+        self._file_identifiers.pop(path, None)
+        self.resolved.clear()
+        self.resolution_cache.clear()
+        entry = self.files.get(path)
+        if entry is None:
+            return False
+        # dict.get does not extract the identifiers of a lazy entry
+        changed = set(dict.get(entry, "childrens", ())) != set(identifiers)
+        entry["childrens"] = identifiers
+        return changed
+
+    def file_identifiers(self, path: str, parse_cache) -> Set[str]:
+        """
+        All identifiers appearing in a file (e.g. __init__.py), with one scan per file in the run
+        """
+        if path not in self._file_identifiers:
+            parsed_file = parse_cache.get(path)
+            if parsed_file is None:
+                self._file_identifiers[path] = set()
+            else:
+                self._file_identifiers[path] = parsed_file.identifiers
+        return self._file_identifiers[path]
+
+    def resolve(self, import_detail: Dict) -> Tuple:
+        """
+        Resolve an absolute import, see search_by_repo_graph
+
+        Return:
+            import_path (str or None), import_file_or_folder (bool or None)
+        """
+        key = (import_detail["package"], import_detail["module"])
+        if key not in self.resolved:
+            if import_detail["package"] is not None:
+                # import could be from fol1.fol2.file1 import
+                self.resolved[key] = self.search_chain(import_detail["package"].split("."), import_detail["module"])
+            else:
+                separated_path = import_detail["module"].split(".")
+                self.resolved[key] = self.search_chain(separated_path[:-1], separated_path[-1])
+        return self.resolved[key]
+
+    def search_chain(self, separated_path: List[str], module: str) -> Tuple:
+        if len(separated_path) == 0: # import module
+            # the module is searched in the root path
+            tracks = [self.repo_graph]
+        else:
+            tracks = self.tracks.get(separated_path[0], [])
+
+        for track in tracks:
+            # start_point is always covered, skip 0 position
+            track_verified, import_file_or_folder = self.verify_track(separated_path[1:], module, track)
+            if track_verified:
+                return track_verified, import_file_or_folder
+        return None, None
+
+    def verify_track(self, separated_path: List[str], module: str, track: Dict) -> Tuple:
+        is_file = is_file_entry(track)
+        members = self.file_members(track["path"]) if is_file else track["childrens"]
+
+        name = separated_path[0] if separated_path else module
+        module_childrens = [name + py_ext for py_ext in PY_EXTENSIONS if name + py_ext in members]
+        assert len(module_childrens) <= 1, module_childrens
+
+        if len(separated_path) == 0:
+            if module not in members and len(module_childrens) == 0:
+                if not is_file and track["path"] in self.exports: # from folder(.__init__) import module
+                    if module not in self.file_members(self.exports[track["path"]]):
+                        return False, False
+                    return track["childrens"]["__init__.py"]["path"], False
+                return False, False
+            elif module in members:
+                if is_file:
+                    return track["path"], False
+                # import folder
+                return track["childrens"][module]["path"], True
+            elif is_file:
+                return False, False
+            # import file
+            if module + ".py" in module_childrens:
+                return track["childrens"][module + ".py"]["path"], True
+            return track["childrens"][module_childrens[0]]["path"], True
+
+        if is_file or (name not in members and len(module_childrens) == 0):
+            return False, False
+        if name in members:
+            return self.verify_track(separated_path[1:], module, track["childrens"][name])
+        return self.verify_track(separated_path[1:], module, track["childrens"][module_childrens[0]])
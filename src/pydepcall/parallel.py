@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Tuple
+
+from .Node import FunctionNode
+from .build_repo_graph import get_identifier_in_file
+from .parse_cache import ParseCache
+from .scanner import RepoScanner
+
+# Parse cache of a worker process
+_worker_cache = None
+
+# FunctionNode metadata read when linking the dependencies
+LINKING_METADATA = ("name", "params", "return_type", "called_identifiers")
+# FunctionNode metadata saved in an index (see node_to_record)
+INDEX_METADATA = LINKING_METADATA + ("signature", "docstring")
+
+
+def summarize_file(path: str, metadata: Tuple[str, ...]= LINKING_METADATA) -> Dict:
+    """
+    Compute the local facts of a file, which do not depend on other files: its identifiers, its definitions
+    and statements with their byte ranges, its parsed imports and the metadata of its functions.
+    The summary only contains plain data so that it can be sent back from a worker process,
+    the file is then built from it without a parse (see ParseCache.add_summary)
+
+    Args:
+        path: local path of the file
+        metadata: FunctionNode attributes to compute, the others are computed on first access
+
+    Return:
+        {"path": path,
+         "digest": content hash of the file (None if the file can not be read),
+         "identifiers": identifiers of the file for the repo graph,
+         "summary": summary of the parsed file (see ParsedFile.summary), with the FunctionNode metadata
+            keyed by byte range of the function in "function_metadata"}
+    """
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = ParseCache()
+
+    summary = {"path": path, "digest": None, "identifiers": [], "summary": None}
+    parsed_file = _worker_cache.get(path)
+    if parsed_file is None:
+        return summary
+
+    summary["digest"] = parsed_file.digest
+    summary["identifiers"] = get_identifier_in_file(path, _worker_cache)["childrens"]
+    # all identifiers of __init__ files are read to resolve relative imports (see ModuleIndex.file_identifiers)
+    summary["summary"] = parsed_file.summary(identifiers= os.path.basename(path) == "__init__.py")
+    function_metadata = summary["summary"]["function_metadata"] = {}
+    for _, node in parsed_file.functions:
+        function = FunctionNode(path, None, node)
+        function_metadata[(node.start_byte, node.end_byte)] = {attribute: getattr(function, attribute) for attribute in metadata}
+    # Trees are not needed anymore in the worker
+    _worker_cache.clear()
+    return summary
+
+
+def summarize_files(paths: List[str], workers: int, metadata: Tuple[str, ...]= LINKING_METADATA) -> List[Dict]:
+    """
+    Summarize files with a pool of processes. Summaries are returned in the order of `paths`
+
+    Args:
+        paths: local paths of the files
+        workers: number of processes
+        metadata: FunctionNode attributes to compute (see summarize_file)
+    """
+    if workers <= 1 or len(paths) <= 1:
+        return [summarize_file(path, metadata) for path in paths]
+
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers= workers) as executor:
+        return list(executor.map(partial(summarize_file, metadata= metadata), paths, chunksize= chunksize))
+
+
+def get_python_files(repo_src: str, scanner: RepoScanner= None) -> List[str]:
+    """
+    Get all files with python extensions in a repository, as listed in the repo graph
+    """
+    if scanner is None:
+        scanner = RepoScanner(repo_src)
+    return scanner.python_files()
@@ -0,0 +1,498 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import tree_sitter
+
+from .utils import language_parser, get_node_by_kind, get_definition_name, parse_import
+from .constant import PARSE_CACHE_MAX_BYTES
+from .symbol_table import SymbolTable
+
+# tree-sitter trees are not introspectable, their size is estimated from the source length
+TREE_BYTES_PER_SOURCE_BYTE = 10
+
+
+class SourceFile:
+    """
+    Source buffer of a module file, shared by all nodes extracted from the file. Nodes keep
+    their byte range in the buffer instead of a copy of their content and a tree-sitter node
+
+    Attributes:
+        source (bytes): utf-8 encoded content of the file (or a memoryview, see load_result)
+        tree (tree_sitter.Tree): tree parsed from the source, None once released
+    """
+    __slots__ = ("source", "tree")
+
+    def __init__(self, source: bytes, tree: tree_sitter.Tree= None):
+        self.source = source
+        self.tree = tree
+
+    @property
+    def root_node(self) -> tree_sitter.Node:
+        # Released trees are parsed again on demand
+        if self.tree is None:
+            self.tree = language_parser.parse(bytes(self.source))
+        return self.tree.root_node
+
+    def text(self, start_byte: int, end_byte: int) -> str:
+        return str(self.source[start_byte:end_byte], "utf8")
+
+    def node_at(self, start_byte: int, end_byte: int, node_types: Tuple[str, ...]) -> Optional[tree_sitter.Node]:
+        """
+        Get the tree-sitter node of a type spanning exactly a byte range
+
+        Args:
+            start_byte, end_byte: range of the node in the source
+            node_types: accepted types of the node (a node could have a child with the same range)
+        """
+        node = self.root_node.descendant_for_byte_range(start_byte, end_byte)
+        while node is not None and (node.start_byte, node.end_byte) == (start_byte, end_byte):
+            if node.type in node_types:
+                return node
+            node = node.parent
+        return None
+
+    def release(self) -> None:
+        self.tree = None
+
+
+class SyntaxRange:
+    """
+    Stand-in for a tree-sitter node of a file summarized by another process (see ParsedFile.summary):
+    the type, byte range and points of a definition or statement in the source of the file
+    """
+    __slots__ = ("type", "start_byte", "end_byte", "start_point", "end_point", "source")
+
+    def __init__(self, type: str, start_byte: int, end_byte: int, start_point: Tuple[int, int], end_point: Tuple[int, int], source: bytes):
+        self.type = type
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.start_point = tree_sitter.Point(*start_point)
+        self.end_point = tree_sitter.Point(*end_point)
+        self.source = source
+
+    @property
+    def text(self) -> bytes:
+        return bytes(self.source[self.start_byte:self.end_byte])
+
+
+def node_range(node: tree_sitter.Node) -> Tuple:
+    """
+    Plain-data range of a tree-sitter node, see SyntaxRange
+    """
+    return (node.type, node.start_byte, node.end_byte, tuple(node.start_point), tuple(node.end_point))
+
+
+def common_prefix_length(a: bytes, b: bytes) -> int:
+    """
+    Length of the common prefix of two buffers, by binary search on memory comparisons
+    """
+    a, b = memoryview(a), memoryview(b)
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def source_edit(old_source: bytes, new_source: bytes) -> Tuple[int, int, int]:
+    """
+    Smallest single edit turning a source into another: the bytes outside the common prefix and suffix
+
+    Return:
+        (start byte, old end byte, new end byte)
+    """
+    start = common_prefix_length(old_source, new_source)
+    old_rest, new_rest = memoryview(old_source)[start:], memoryview(new_source)[start:]
+    # common suffix, not overlapping the prefix
+    low, high = 0, min(len(old_rest), len(new_rest))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old_rest[len(old_rest) - middle:] == new_rest[len(new_rest) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return start, len(old_source) - low, len(new_source) - low
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Sorted byte ranges without overlap, overlapping or touching ranges are merged
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def point_at(source: bytes, offset: int) -> Tuple[int, int]:
+    """
+    tree-sitter point (row, byte column) of a byte offset
+    """
+    return source.count(b"\n", 0, offset), offset - (source.rfind(b"\n", 0, offset) + 1)
+
+
+class ParsedFile:
+    """
+    Parse result of a module file. Entries are content-addressed, so files
+    with the same content share one ParsedFile.
+
+    A file summarized by another process (see summary) is built from its summary without a parse:
+    its definitions and statements are SyntaxRange instead of tree-sitter nodes, and its tree is only
+    parsed if it is read
+
+    Attributes:
+        digest (str): content hash of the source
+        source (bytes): utf-8 encoded content of the file
+        tree (tree_sitter.Tree): tree parsed from the source, parsed on first access for a summarized file
+        source_file (SourceFile): source buffer shared by the nodes extracted from the file
+        functions (list): (name, node) of function definitions which are not inside a class
+        classes (list): (name, node) of class definitions which are not inside a function
+        imports (list): all import statement nodes of the file
+        function_metadata (dict): precomputed FunctionNode metadata, keyed by byte range of the function
+        import_details (dict): parsed imports (see parse_import) of each import statement, keyed by byte range
+        symbol_table (SymbolTable): definitions of the file by name, built on first access
+        identifiers (set): all identifiers appearing in the file, computed on first access
+    """
+    def __init__(self, digest: str, source: bytes, tree: tree_sitter.Tree, summary: Dict= None):
+        self.digest = digest
+        self.source = source
+        self._tree = tree
+        self.source_file = SourceFile(source, tree)
+        self.function_metadata = {}
+        self.import_details = {}
+        self._symbol_table = None
+        self._identifiers = None
+
+        if summary is not None:
+            self.load_summary(summary)
+            return
+        root_node = tree.root_node
+        self.functions = [(get_definition_name(node), node) for node in get_node_by_kind(root_node, kind= ["function_definition"], ignore_kind=["class_definition"], avoid_nested= True)]
+        self.classes = [(get_definition_name(node), node) for node in get_node_by_kind(root_node, kind= ["class_definition"], ignore_kind=["function_definition"], avoid_nested= True)]
+        self.imports = get_node_by_kind(root_node, kind = ["import_statement", "import_from_statement", "future_import_statement"])
+
+    @property
+    def tree(self) -> tree_sitter.Tree:
+        if self._tree is None:
+            self.source_file.root_node
+            self._tree = self.source_file.tree
+        return self._tree
+
+    @property
+    def root_node(self) -> tree_sitter.Node:
+        return self.tree.root_node
+
+    @property
+    def symbol_table(self) -> SymbolTable:
+        if self._symbol_table is None:
+            self._symbol_table = SymbolTable(self.functions, self.classes, self.tree.root_node)
+        return self._symbol_table
+
+    @property
+    def identifiers(self) -> Set[str]:
+        if self._identifiers is None:
+            self._identifiers = set(x.text.decode() for x in get_node_by_kind(self.root_node, kind=["identifier"]))
+        return self._identifiers
+
+    def summary(self, identifiers: bool= False) -> Dict:
+        """
+        Plain-data summary of the definitions and statements of the file, from which the ParsedFile
+        is built again without a parse (see ParseCache.add_summary). The byte ranges identify the nodes
+
+        Args:
+            identifiers: whether to include all identifiers of the file (see identifiers)
+
+        Return:
+            {"functions": [(name, range)], "classes": [(name, range)],
+             "imports": [(range, parsed imports)], "symbols": [(rank, index, kind, name, range, names)],
+             "identifiers": list of identifiers or None}, with ranges as returned by node_range
+        """
+        symbol_table = self.symbol_table
+        return {"functions": [(name, node_range(node)) for name, node in self.functions],
+                "classes": [(name, node_range(node)) for name, node in self.classes],
+                "imports": [(node_range(node), parse_import(node)) for node in self.imports],
+                "symbols": [(rank, index, kind, name, node_range(node), names) for (rank, index, kind, name, node), names in zip(symbol_table.entries, symbol_table.entry_names)],
+                "identifiers": sorted(self.identifiers) if identifiers else None}
+
+    def load_summary(self, summary: Dict) -> None:
+        """
+        Set the definitions and statements of the file from its summary (see summary)
+        """
+        ranges = {}
+        def syntax_range(node_range: Tuple) -> SyntaxRange:
+            # the same node is shared by the lists and the symbol table, as with a parse
+            if node_range not in ranges:
+                ranges[node_range] = SyntaxRange(*node_range, self.source)
+            return ranges[node_range]
+
+        self.functions = [(name, syntax_range(x)) for name, x in summary["functions"]]
+        self.classes = [(name, syntax_range(x)) for name, x in summary["classes"]]
+        self.imports = [syntax_range(x) for x, _ in summary["imports"]]
+        self.import_details = {(x[1], x[2]): details for x, details in summary["imports"]}
+        self._symbol_table = SymbolTable.from_entries(((rank, index, kind, name, syntax_range(x)), names) for rank, index, kind, name, x, names in summary["symbols"])
+        if summary["identifiers"] is not None:
+            self._identifiers = set(summary["identifiers"])
+        self.function_metadata = dict(summary.get("function_metadata", {}))
+
+    @property
+    def content(self) -> str:
+        return self.source.decode("utf8")
+
+    @property
+    def size(self) -> int:
+        return len(self.source) * (TREE_BYTES_PER_SOURCE_BYTE + 1)
+
+
+class ParseCache:
+    """
+    Per-run cache of parsed module files, keyed by path plus content hash.
+    Least recently used entries are evicted once the estimated memory exceeds `max_bytes`
+
+    Attributes:
+        max_bytes (int): approximate memory cap of the cache, None for unlimited
+        hits (int): number of lookups served from the cache
+        misses (int): number of lookups which needed a tree-sitter parse
+        evictions (int): number of entries dropped by the memory cap
+        stat_calls (int): number of stat calls to check if a file changed
+        files_read (int): number of files read from disk
+        read_seconds (float): time spent reading files
+        parse_seconds (float): time spent in tree-sitter parses
+        incremental_parses (int): number of parses reusing the edited tree of the previous content (see reparse)
+        summarized (int): number of files built from a summary computed elsewhere, without a parse (see add_summary)
+    """
+    def __init__(self, max_bytes: Optional[int] = PARSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stat_calls = 0
+        self.files_read = 0
+        self.read_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.incremental_parses = 0
+        self.summarized = 0
+
+        self._entries: "OrderedDict[str, ParsedFile]" = OrderedDict()
+        self._paths: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._size = 0
+        self._summaries: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def full(self) -> bool:
+        """
+        Whether one more entry would evict the least recently used ones
+        """
+        return self.max_bytes is not None and self._size >= self.max_bytes
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._paths and self._paths[path][1] in self._entries
+
+    def get(self, path: str) -> Optional[ParsedFile]:
+        """
+        Get the parse result of a file, reading and parsing it only if its content is unknown
+
+        Args:
+            path: local path of the file
+
+        Return:
+            ParsedFile, or None if the file can not be read (directory, binary, ...)
+        """
+        self.stat_calls += 1
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        known = self._paths.get(path)
+        if known is not None and known[0] == signature and known[1] in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(known[1])
+            return self._entries[known[1]]
+
+        start = time.perf_counter()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except:
+            return None
+        finally:
+            self.read_seconds += time.perf_counter() - start
+        return self.add_file(path, content, signature)
+
+    def add_file(self, path: str, content: str, signature: Tuple[int, int]) -> ParsedFile:
+        """
+        Parse the content of a file read elsewhere (e.g. prefetched by AsyncExtractor)
+
+        Args:
+            path: local path of the file
+            content: content of the file
+            signature: (st_mtime_ns, st_size) of the file, taken before it was read
+        """
+        self.files_read += 1
+        parsed = self.parse(content)
+        self._paths[path] = (signature, parsed.digest)
+        return parsed
+
+    def peek(self, path: str) -> Optional[ParsedFile]:
+        """
+        Cached parse result of the last content of a file, without checking the file
+        """
+        known = self._paths.get(path)
+        return self._entries.get(known[1]) if known is not None else None
+
+    def reparse(self, path: str, content: str, previous: ParsedFile= None, previous_source: bytes= None) -> Tuple[ParsedFile, List[Tuple[int, int]]]:
+        """
+        Parse the new content of a file incrementally: the tree of its previous content is edited
+        (Tree.edit) and reused by tree-sitter. The previous parse result is dropped from the cache,
+        since its tree now describes the new content, and parsed again if it is read later
+
+        Args:
+            path: local path of the file
+            content: new content of the file
+            previous: parse result of the previous content (see peek)
+            previous_source: previous content, parsed again if its parse result is not available.
+                Without both, the whole content is considered changed
+
+        Return:
+            parse result of the new content
+            changed byte ranges of the new content, sorted and merged: the edited bytes and the ranges whose syntax changed
+        """
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        source = bytes(content, "utf8")
+        if previous is None and previous_source is None:
+            return self.add_file(path, content, signature), [(0, len(source))]
+        if previous is None:
+            # the previous tree is needed for the ranges whose syntax changed outside the edit
+            previous_source = bytes(previous_source)
+            parse_start = time.perf_counter()
+            previous = ParsedFile(hashlib.blake2b(previous_source, digest_size=16).hexdigest(), previous_source, language_parser.parse(previous_source))
+            self.parse_seconds += time.perf_counter() - parse_start
+            self.misses += 1
+
+        previous_source = bytes(previous.source)
+        start, old_end, new_end = source_edit(previous_source, source)
+        changed_ranges = [(start, new_end)]
+        digest = hashlib.blake2b(source, digest_size=16).hexdigest()
+        if digest in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(digest)
+        else:
+            self.misses += 1
+            self.incremental_parses += 1
+            tree = previous.tree
+            if self._entries.get(previous.digest) is previous:
+                self.drop(previous.digest)
+            tree.edit(start_byte= start, old_end_byte= old_end, new_end_byte= new_end,
+                      start_point= point_at(previous_source, start), old_end_point= point_at(previous_source, old_end),
+                      new_end_point= point_at(source, new_end))
+            parse_start = time.perf_counter()
+            new_tree = language_parser.parse(source, tree)
+            self.parse_seconds += time.perf_counter() - parse_start
+            changed_ranges.extend((x.start_byte, x.end_byte) for x in tree.changed_ranges(new_tree))
+
+            parsed = ParsedFile(digest, source, new_tree)
+            self._entries[digest] = parsed
+            self._size += parsed.size
+            self._evict()
+        self._paths[path] = (signature, digest)
+        return self._entries[digest], merge_ranges(changed_ranges)
+
+    def drop(self, digest: str) -> None:
+        """
+        Remove a parse result from the cache, nodes using its source parse it again if needed
+        """
+        parsed = self._entries.pop(digest, None)
+        if parsed is not None:
+            self._size -= parsed.size
+            parsed.source_file.release()
+
+    def parse(self, content: str) -> ParsedFile:
+        """
+        Get the parse result of an in-memory content
+
+        Args:
+            content: input text content
+        """
+        source = bytes(content, "utf8")
+        digest = hashlib.blake2b(source, digest_size=16).hexdigest()
+
+        if digest in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(digest)
+            return self._entries[digest]
+
+        if digest in self._summaries:
+            self.summarized += 1
+            parsed = ParsedFile(digest, source, None, self._summaries[digest])
+        else:
+            self.misses += 1
+            start = time.perf_counter()
+            tree = language_parser.parse(source)
+            self.parse_seconds += time.perf_counter() - start
+            parsed = ParsedFile(digest, source, tree)
+        self._entries[digest] = parsed
+        self._size += parsed.size
+        self._evict()
+        return parsed
+
+    def add_summary(self, digest: str, summary: Dict) -> None:
+        """
+        Register the summary of a file computed elsewhere (e.g. in a worker process, see ParsedFile.summary).
+        The file is then built from the summary instead of being parsed, as long as its content has this digest
+
+        Args:
+            digest: content hash of the file
+            summary: summary of the file, with the precomputed FunctionNode metadata keyed by byte range
+                of the function in "function_metadata"
+        """
+        self._summaries[digest] = summary
+
+    def clear(self) -> None:
+        """
+        Release the parsed files. The summaries (see add_summary) are kept,
+        the next extraction builds the files from them again
+        """
+        for parsed in self._entries.values():
+            parsed.source_file.release()
+        self._entries.clear()
+        self._paths.clear()
+        self._size = 0
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stat_calls": self.stat_calls,
+                "files_read": self.files_read,
+                "read_seconds": round(self.read_seconds, 6),
+                "parse_seconds": round(self.parse_seconds, 6),
+                "incremental_parses": self.incremental_parses,
+                "summarized": self.summarized,
+                "entries": len(self._entries),
+                "estimated_bytes": self._size}
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        # Always keep the most recent entry, even if it alone exceeds the cap
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, parsed = self._entries.popitem(last=False)
+            self._size -= parsed.size
+            parsed.source_file.release()
+            self.evictions += 1
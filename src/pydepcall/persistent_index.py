@@ -0,0 +1,321 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+from .Node import FunctionNode, ImportNode, ClassNode, BlockNode
+from .scanner import RepoScanner
+from .reverse_index import ReverseIndex
+from .build_repo_graph import is_file_entry
+
+# The index is plain JSON so that loading an index can not run code, whoever wrote it
+INDEX_VERSION = 2
+INDEX_FILENAME = "index.json"
+
+
+class PersistentIndex:
+    """
+    On-disk index of a previous extraction, so that a new run only re-extracts the changed files.
+    Nodes restored from the index do not hold a tree_sitter_node (None)
+
+    Attributes:
+        index_dir (str): directory storing the index
+        repo_src (str): local path of the indexed repository
+        files (dict): file path -> {"signature": (mtime, size), "digest": content hash, "identifiers": identifiers in file}
+        modules (set): module files whose functions and imports were fully extracted
+        records (dict): serialized nodes of the extraction, grouped by node type and path
+        changed (set): files added, modified or removed since the index was saved
+        added_or_removed (set): files added or removed since the index was saved
+        refreshed (set): files found added, modified or removed by the last refresh
+    """
+    def __init__(self, index_dir: str, repo_src: str):
+        self.index_dir = index_dir
+        self.repo_src = repo_src
+        self.files = {}
+        self.modules = set()
+        self.records = {"function": {}, "import": {}}
+        self.changed = set()
+        self.added_or_removed = set()
+        self.refreshed = set()
+        self._restored = []
+        self.load()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.index_dir, INDEX_FILENAME)
+
+    def load(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION or data.get("repo_src") != self.repo_src:
+                return
+            files = {path: {"signature": tuple(record["signature"]), "digest": record["digest"], "identifiers": record["identifiers"]} \
+                for path, record in data["files"].items()}
+            modules = set(data["modules"])
+            records = {node_type: {path: {key: json_to_record(record) for key, record in nodes.items()} \
+                for path, nodes in data["records"][node_type].items()} for node_type in ["function", "import"]}
+        except Exception:
+            # Corrupted index, extract from scratch
+            return
+        self.files = files
+        self.modules = modules
+        self.records = records
+
+    def save(self, module_function_dict: Dict, modules: Set[str]) -> None:
+        """
+        Save the extraction result into the index directory
+
+        Args:
+            module_function_dict: all extracted FunctionNode and ImportNode, grouped by type and path
+            modules: module files whose functions and imports were fully extracted
+        """
+        records = {"function": {}, "import": {}}
+        for node_type in records:
+            for path, nodes in module_function_dict[node_type].items():
+                records[node_type][path] = {key: node_to_record(node) for key, node in nodes.items() if type(node) in [FunctionNode, ImportNode]}
+
+        data = {"version": INDEX_VERSION,
+                "repo_src": self.repo_src,
+                "files": self.files,
+                "modules": sorted(modules),
+                "records": records}
+
+        if not os.path.exists(self.index_dir):
+            os.makedirs(self.index_dir)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+        self.modules = set(modules)
+        self.records = records
+        self.changed = set()
+        self.added_or_removed = set()
+
+    def refresh(self, scanner: RepoScanner= None) -> None:
+        """
+        Compare the indexed files with the repository, collecting the changed files.
+        Files are only read when their mtime or size differs from the index
+
+        Args:
+            scanner: lists the python files of the repository (see RepoScanner)
+        """
+        if scanner is None:
+            scanner = RepoScanner(self.repo_src)
+
+        current = {}
+        refreshed = set()
+        for path in scanner.python_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+
+            record = self.files.get(path)
+            if record is not None and record["signature"] == signature:
+                current[path] = record
+                continue
+
+            try:
+                with open(path, "rb") as f:
+                    digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            except OSError:
+                continue
+            if record is not None and record["digest"] == digest:
+                current[path] = {"signature": signature, "digest": digest, "identifiers": record["identifiers"]}
+            else:
+                current[path] = {"signature": signature, "digest": digest, "identifiers": None}
+                refreshed.add(path)
+                if record is None:
+                    self.added_or_removed.add(path)
+
+        removed = set(self.files) - set(current)
+        self.added_or_removed.update(removed)
+        self.refreshed = refreshed | removed
+        self.changed.update(self.refreshed)
+        self.files = current
+
+    def known_identifiers(self) -> Dict[str, Dict]:
+        """
+        Repo graph entries (see get_identifier_in_file) of the unchanged files
+        """
+        return {path: {"path": path, "childrens": record["identifiers"]} for path, record in self.files.items() \
+            if path not in self.changed and record["identifiers"] is not None}
+
+    def update_identifiers(self, repo_graph: Dict) -> None:
+        """
+        Store the identifiers of every file in the repo graph. Files of a lazy graph whose
+        identifiers are not extracted yet are skipped
+        """
+        if is_file_entry(repo_graph):
+            if "childrens" in repo_graph and repo_graph["path"] in self.files:
+                self.files[repo_graph["path"]]["identifiers"] = repo_graph["childrens"]
+            return
+        for child in repo_graph["childrens"].values():
+            self.update_identifiers(child)
+
+    def is_dirty(self, module: str) -> bool:
+        return module in self.changed or module not in self.modules
+
+    def clean_modules(self) -> Set[str]:
+        return set(x for x in self.modules if x not in self.changed)
+
+    def restore(self) -> Tuple[Dict, Dict[str, Set[str]]]:
+        """
+        Rebuild the extracted nodes of the unchanged files.
+        Import statements whose resolution could be affected by the changed files are not restored
+
+        Return:
+            module_function_dict of the restored nodes
+            stale import statements to be extracted again, grouped by path
+        """
+        module_function_dict = {"function": {}, "import": {}}
+        stale_imports = {}
+        self._restored = []
+
+        # A modified file can only attract imports of its own name (or of its package for __init__),
+        # an added or removed file can also create or remove its folder
+        changed_names = set()
+        for path in self.changed:
+            filename = os.path.splitext(os.path.basename(path))[0]
+            if filename == "__init__" or path in self.added_or_removed:
+                changed_names.add(os.path.basename(os.path.dirname(path)))
+            if filename != "__init__":
+                changed_names.add(filename)
+
+        for node_type in ["function", "import"]:
+            for path, records in self.records[node_type].items():
+                if path in self.changed:
+                    continue
+                module_function_dict[node_type][path] = {}
+                for key, record in records.items():
+                    if node_type == "import" and is_stale_import(record["import_dict"], path, self.changed, changed_names):
+                        stale_imports.setdefault(path, set()).add(key)
+                        continue
+                    node = record_to_node(node_type, path, record)
+                    module_function_dict[node_type][path][key] = node
+                    self._restored.append((node, record["children"]))
+        return module_function_dict, stale_imports
+
+    def link(self, module_function_dict: Dict, reverse_index: ReverseIndex= None) -> None:
+        """
+        Link the children of the restored nodes with the nodes of the current extraction,
+        recording the edges in the reverse index if any
+        """
+        for node, children in self._restored:
+            node.children = []
+            for child in children:
+                if child[0] in ["function", "import"]:
+                    _, path, key = child
+                    if key in module_function_dict[child[0]].get(path, {}):
+                        node.children.append(module_function_dict[child[0]][path][key])
+                    else:
+                        continue
+                else:
+                    node.children.append(record_to_node(child[0], child[1], child[2]))
+                if reverse_index is not None:
+                    reverse_index.add(node, node.children[-1])
+        self._restored = []
+
+
+def is_stale_import(import_dict: List[Dict], filepath: str, changed: Set[str], changed_names: Set[str]) -> bool:
+    """
+    Whether the resolution of an import statement could be affected by the changed files.
+    It is the case when the import is resolved into a changed file, when a relative import
+    looks up a changed __init__ file, or when a changed file (or its folder) has the same
+    name as one of the imported packages/modules
+    """
+    for import_detail in import_dict:
+        if import_detail["import_path"] in changed:
+            return True
+        if import_detail["package"] is not None and import_detail["package"].startswith("."):
+            if relative_init_path(import_detail["package"], filepath) in changed:
+                return True
+        components = import_detail["module"].split(".")
+        if import_detail["package"] is not None:
+            components.extend(import_detail["package"].lstrip(".").split("."))
+        if changed_names.intersection(components):
+            return True
+    return False
+
+
+def relative_init_path(package: str, filepath: str) -> str:
+    """
+    The __init__ file looked up by import_analyze for a relative import
+    """
+    for import_prefix in ["...", "..", "."]:
+        if package.startswith(import_prefix):
+            start_dir = filepath
+            for _ in range(len(import_prefix)):
+                start_dir = os.path.dirname(start_dir)
+            return os.path.join(start_dir, package[len(import_prefix):].replace(".", "/"), "__init__.py")
+
+
+def child_to_ref(node) -> Tuple:
+    if type(node) is FunctionNode:
+        return ("function", node.path, node.name)
+    elif type(node) is ImportNode:
+        return ("import", node.path, node.content)
+    elif type(node) is ClassNode:
+        return ("class", node.path, {"content": node.content, "position_in_file": node.position_in_file, "name": node.name})
+    elif type(node) is BlockNode:
+        return ("block", node.path, {"content": node.content, "position_in_file": node.position_in_file, "name": node.name})
+    raise ValueError("node type {} hasn't supported yet!".format(type(node)))
+
+
+def node_to_record(node) -> Dict:
+    if type(node) is FunctionNode:
+        record = {"content": node.content,
+                  "signature": node.signature,
+                  "position_in_file": node.position_in_file,
+                  "name": node.name,
+                  "params": node.params,
+                  "return_type": node.return_type,
+                  "docstring": node.docstring,
+                  "called_identifiers": node.called_identifiers,
+                  "children": [child_to_ref(x) for x in node.children]}
+    else:
+        record = {"content": node.content,
+                  "position_in_file": node.position_in_file,
+                  "import_dict": node.import_dict,
+                  "children": [child_to_ref(x) for x in node.children]}
+    # only bounded extractions have truncated nodes (see ExtractionBudget)
+    if node.truncated:
+        record["truncated"] = True
+    return record
+
+
+def json_to_record(record: Dict) -> Dict:
+    """
+    Record of node_to_record read from JSON, where the tuples (positions, children references) are lists
+    """
+    record["position_in_file"] = position_from_json(record["position_in_file"])
+    children = []
+    for node_type, path, key in record["children"]:
+        if node_type in ["class", "block"]:
+            key["position_in_file"] = position_from_json(key["position_in_file"])
+        children.append((node_type, path, key))
+    record["children"] = children
+    return record
+
+
+def position_from_json(position: List) -> Tuple:
+    return tuple(tuple(x) for x in position) if position is not None else None
+
+
+def record_to_node(node_type: str, path: str, record: Dict):
+    node_class = {"function": FunctionNode, "import": ImportNode, "class": ClassNode, "block": BlockNode}[node_type]
+    node = node_class.__new__(node_class)
+    node.path = path
+    node.tree_sitter_node = None
+    node.start_byte, node.end_byte = None, None
+    for attribute, value in record.items():
+        if attribute != "children":
+            setattr(node, attribute, value)
+    if node_type in ["function", "import"]:
+        node.children = []
+    return node
@@ -0,0 +1,96 @@
+from typing import Dict, Set, Tuple
+
+from .Node import FunctionNode, ImportNode, ClassNode, BlockNode
+
+
+def dependency_key(node) -> Tuple:
+    """
+    Key of a node in the reverse index: ("function", path, name), ("import", path, content),
+    ("class", path, start point) or ("block", path, start point)
+    """
+    if type(node) is FunctionNode:
+        return ("function", node.path, node.name)
+    elif type(node) is ImportNode:
+        return ("import", node.path, node.content)
+    elif type(node) is ClassNode:
+        return ("class", node.path, tuple(node.position_in_file[0]))
+    elif type(node) is BlockNode:
+        return ("block", node.path, tuple(node.position_in_file[0]))
+    raise ValueError("node type {} hasn't supported yet!".format(type(node)))
+
+
+class ReverseIndex:
+    """
+    Dependents of the extracted nodes, recorded while the dependencies are linked (see link_dependency)
+
+    Attributes:
+        dependents (dict): node key -> keys of the nodes which directly depend on it
+        dependencies (dict): node key -> keys of its direct dependencies, to remove the edges of a node again
+    """
+    def __init__(self):
+        self.dependents: Dict[Tuple, Set[Tuple]] = {}
+        self.dependencies: Dict[Tuple, Set[Tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self.dependencies)
+
+    def add(self, target_node, dependency) -> None:
+        """
+        Record that `target_node` depends on `dependency`
+        """
+        target_key, dependency_key_ = dependency_key(target_node), dependency_key(dependency)
+        self.dependencies.setdefault(target_key, set()).add(dependency_key_)
+        self.dependents.setdefault(dependency_key_, set()).add(target_key)
+
+    def remove(self, key: Tuple) -> None:
+        """
+        Remove the dependencies of a node (e.g. before the node is extracted again)
+        """
+        for dependency in self.dependencies.pop(key, ()):
+            dependents = self.dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self.dependents[dependency]
+
+    def remove_path(self, path: str) -> None:
+        """
+        Remove the dependencies of every node of a file (e.g. a changed file)
+        """
+        for key in [x for x in self.dependencies if x[1] == path]:
+            self.remove(key)
+
+    def get_dependents(self, key: Tuple, transitive: bool= False) -> Set[Tuple]:
+        """
+        Keys of the nodes depending on the node `key` (see dependency_key)
+
+        Args:
+            key: key of the node
+            transitive: also return the nodes depending on it through other nodes. The node itself is not included
+        """
+        return reachable(self.dependents, key, transitive)
+
+    def get_dependencies(self, key: Tuple, transitive: bool= False) -> Set[Tuple]:
+        """
+        Keys of the dependencies of the node `key` (see dependency_key)
+
+        Args:
+            key: key of the node
+            transitive: also return the dependencies of its dependencies. The node itself is not included
+        """
+        return reachable(self.dependencies, key, transitive)
+
+
+def reachable(edges: Dict[Tuple, Set[Tuple]], key: Tuple, transitive: bool) -> Set[Tuple]:
+    if not transitive:
+        return set(edges.get(key, ()))
+
+    result = set()
+    stack = [key]
+    while stack:
+        for neighbor in edges.get(stack.pop(), ()):
+            if neighbor not in result:
+                result.add(neighbor)
+                stack.append(neighbor)
+    result.discard(key)
+    return result
@@ -0,0 +1,168 @@
+import os
+import re
+import fnmatch
+from typing import Dict, List, Optional, Tuple
+
+from .constant import PY_EXTENSIONS, EXCLUDED_DIRECTORIES, ROOT_EXCLUDED_DIRECTORIES
+
+
+def translate_gitignore(pattern: str) -> Optional[Tuple]:
+    """
+    Compile a line of a .gitignore file
+
+    Return:
+        (regex matching the path relative to the .gitignore folder, negated, only matches folders),
+        None for blank lines and comments
+    """
+    pattern = pattern.rstrip("\r\n").rstrip(" ")
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"): # \# or \!
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+
+    # a pattern with a slash is relative to the .gitignore folder, otherwise it matches at any depth
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and pattern.find("]", i + 1) != -1:
+            end = pattern.find("]", i + 1)
+            char_class = pattern[i + 1:end]
+            if char_class.startswith("!"):
+                char_class = "^" + char_class[1:]
+            regex += "[" + char_class.replace("\\", "\\\\") + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(("" if anchored else "(?:.*/)?") + regex), negate, dir_only
+
+
+def read_gitignore(folder: str) -> List[Tuple]:
+    try:
+        with open(os.path.join(folder, ".gitignore"), encoding="utf-8", errors="ignore") as f:
+            return [x for x in map(translate_gitignore, f) if x is not None]
+    except OSError:
+        return []
+
+
+class RepoScanner:
+    """
+    Lists the folders of a repository with os.scandir, once per folder, for the repo graph, the module files
+    and the index. Hidden folders, EXCLUDED_DIRECTORIES, ROOT_EXCLUDED_DIRECTORIES at the root of the repository,
+    virtual environments (folders with a pyvenv.cfg), paths ignored by .gitignore files and paths matching
+    an `exclude` glob are skipped
+
+    Attributes:
+        repo_src (str): local path of the repository
+        include (list): globs of the python files to keep (relative path or file name), all files if None
+        exclude (list): globs of the files and folders to skip (relative path or name)
+        use_gitignore (bool): skip the paths ignored by the .gitignore files of the repository
+    """
+    def __init__(self, repo_src: str, include: List[str]= None, exclude: List[str]= None, use_gitignore: bool= True):
+        self.repo_src = repo_src
+        self.include = include
+        self.exclude = exclude or []
+        self.use_gitignore = use_gitignore
+        self._entries: Dict[str, List[Tuple[str, str, bool]]] = {}
+        self._rules: Dict[str, List[Tuple[str, List[Tuple]]]] = {}
+
+    def entries(self, folder: str) -> List[Tuple[str, str, bool]]:
+        """
+        Sub-folders and python files of a folder, in listing order
+
+        Return:
+            list of (name, path, is folder)
+        """
+        if folder in self._entries:
+            return self._entries[folder]
+
+        entries = []
+        try:
+            with os.scandir(folder) as scanned:
+                scanned = list(scanned)
+        except OSError:
+            scanned = []
+        for entry in scanned:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if not is_dir and not entry.name.endswith(PY_EXTENSIONS):
+                continue
+            if not self.is_excluded(entry.name, entry.path, is_dir):
+                entries.append((entry.name, entry.path, is_dir))
+        self._entries[folder] = entries
+        return entries
+
+    def is_excluded(self, name: str, path: str, is_dir: bool) -> bool:
+        if is_dir and (name.startswith(".") or name in EXCLUDED_DIRECTORIES or os.path.exists(os.path.join(path, "pyvenv.cfg"))):
+            return True
+        if is_dir and name in ROOT_EXCLUDED_DIRECTORIES and os.path.normpath(os.path.dirname(path)) == os.path.normpath(self.repo_src):
+            return True
+
+        relative_path = os.path.relpath(path, self.repo_src).replace(os.sep, "/")
+        if any(fnmatch.fnmatch(relative_path, x) or fnmatch.fnmatch(name, x) for x in self.exclude):
+            return True
+        if not is_dir and self.include is not None and \
+            not any(fnmatch.fnmatch(relative_path, x) or fnmatch.fnmatch(name, x) for x in self.include):
+            return True
+        return self.use_gitignore and self.is_ignored(path, is_dir)
+
+    def gitignore_rules(self, folder: str) -> List[Tuple[str, List[Tuple]]]:
+        """
+        .gitignore rules applying in a folder: (folder of the .gitignore, compiled lines), outermost first
+        """
+        if folder not in self._rules:
+            parent = os.path.dirname(folder)
+            if os.path.normpath(folder) == os.path.normpath(self.repo_src) or parent == folder:
+                rules = []
+            else:
+                rules = list(self.gitignore_rules(parent))
+            own_rules = read_gitignore(folder)
+            if own_rules:
+                rules.append((folder, own_rules))
+            self._rules[folder] = rules
+        return self._rules[folder]
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        # The last matching line decides, lines of deeper .gitignore files come last
+        ignored = False
+        for base, rules in self.gitignore_rules(os.path.dirname(path)):
+            relative_path = os.path.relpath(path, base).replace(os.sep, "/")
+            for regex, negate, dir_only in rules:
+                if (is_dir or not dir_only) and regex.fullmatch(relative_path):
+                    ignored = not negate
+        return ignored
+
+    def python_files(self, folder: str= None) -> List[str]:
+        """
+        All python files under a folder (the repository by default)
+        """
+        python_files = []
+        for name, path, is_dir in self.entries(folder or self.repo_src):
+            if is_dir:
+                python_files.extend(self.python_files(path))
+            else:
+                python_files.append(path)
+        return python_files
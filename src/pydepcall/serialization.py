@@ -0,0 +1,359 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from .Node import ModuleNode, FunctionNode, ImportNode, ClassNode, BlockNode
+from .dependency_graph import DependencyGraph, build_dependency_graph, iter_module_nodes
+from .parse_cache import SourceFile
+from .persistent_index import node_to_record
+
+RESULT_MAGIC = b"PYDEPCAL"
+RESULT_VERSION = 1
+# Missing value of an integer field
+NONE_ID = 0xFFFFFFFF
+
+NODE_CLASSES = [FunctionNode, ImportNode, ClassNode, BlockNode]
+# Fields of a node record, all unsigned 32-bit integers. Strings (path, name, content, source of the file,
+# metadata in JSON) are ids in the string table. The content of a node is its byte range in the source of its file,
+# `content` is only used by nodes without source (restored from an index)
+NODE_FIELDS = ("kind", "path", "name", "content", "source", "metadata",
+               "start_byte", "end_byte", "start_row", "start_column", "end_row", "end_column")
+NODE_SIZE = len(NODE_FIELDS)
+# Fields of a module record: path and range of its nodes (functions, then imports) in module_members
+MODULE_FIELDS = ("path", "members_start", "n_functions", "n_imports")
+MODULE_SIZE = len(MODULE_FIELDS)
+# Sections of the file in order, with the typecode of their items
+SECTIONS = (("string_offsets", "Q"),
+            ("string_data", "B"),
+            ("nodes", "I"),
+            ("edge_offsets", "I"),
+            ("edge_targets", "I"),
+            ("modules", "I"),
+            ("module_members", "I"))
+# magic, version, then (offset in bytes, number of items) of each section
+HEADER = struct.Struct("<8sI" + "QQ" * len(SECTIONS))
+SECTION_ALIGNMENT = 8
+
+
+def module_to_record(module_node: ModuleNode) -> Dict:
+    """
+    Plain data of an extracted module (e.g. to be sent to another process or exported in JSON).
+    Children of functions and imports are references (see child_to_ref)
+    """
+    return {"path": module_node.path,
+            "functions": [node_to_record(x) for x in module_node.function_list],
+            "imports": [node_to_record(x) for x in module_node.import_list]}
+
+
+def export_jsonl(modules: Union[Dict[str, ModuleNode], Iterable[ModuleNode], ModuleNode], output_path: str) -> int:
+    """
+    Write the extraction result as JSON lines, one module (see module_to_record) per line.
+    Modules are written while they are iterated, e.g. from Extractor.iter_extract
+
+    Return:
+        Number of written modules
+    """
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for module_node in iter_module_nodes(modules):
+            f.write(json.dumps(module_to_record(module_node), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+class StringTable:
+    """
+    Interned strings (str or bytes) of a result file
+    """
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array("Q", [0])
+        self.data = bytearray()
+
+    def add(self, value) -> int:
+        if value is None:
+            return NONE_ID
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.offsets) - 1
+            self.data += value.encode("utf8") if isinstance(value, str) else value
+            self.offsets.append(len(self.data))
+        return string_id
+
+
+def node_metadata(node) -> Optional[str]:
+    if type(node) is FunctionNode:
+        metadata = {"signature": node.signature,
+                    "params": node.params,
+                    "return_type": node.return_type,
+                    "docstring": node.docstring,
+                    "called_identifiers": node.called_identifiers}
+    elif type(node) is ImportNode:
+        metadata = {"import_dict": node.import_dict}
+    else:
+        return None
+    if node.truncated:
+        metadata["truncated"] = True
+    return json.dumps(metadata)
+
+
+def save_result(modules: Union[Dict[str, ModuleNode], Iterable[ModuleNode], ModuleNode], output_path: str) -> None:
+    """
+    Write the extraction result (output of Extractor.extract) in the binary result format, see load_result
+
+    Args:
+        modules: extracted modules, as returned by repo_extract, file_extract or iter_extract
+        output_path: path of the written file
+    """
+    module_nodes = list(iter_module_nodes(modules))
+    graph = build_dependency_graph(module_nodes)
+
+    modules_array = array("I")
+    members_array = array("I")
+    strings = StringTable()
+    for module_node in module_nodes:
+        modules_array.extend([strings.add(module_node.path), len(members_array), len(module_node.function_list), len(module_node.import_list)])
+        for node in module_node.function_list + module_node.import_list:
+            members_array.append(graph.node_id(node))
+
+    nodes_array = array("I")
+    source_ids = {}
+    for node in graph.nodes:
+        source_id, content_id = NONE_ID, NONE_ID
+        if node.source_file is not None:
+            if id(node.source_file) not in source_ids:
+                source_ids[id(node.source_file)] = strings.add(bytes(node.source_file.source))
+            source_id = source_ids[id(node.source_file)]
+        else:
+            content_id = strings.add(node.content)
+
+        (start_row, start_column), (end_row, end_column) = node.position_in_file
+        nodes_array.extend([NODE_CLASSES.index(type(node)),
+                            strings.add(node.path),
+                            strings.add(node.name) if type(node) is not ImportNode else NONE_ID,
+                            content_id,
+                            source_id,
+                            strings.add(node_metadata(node)),
+                            node.start_byte if node.start_byte is not None else NONE_ID,
+                            node.end_byte if node.end_byte is not None else NONE_ID,
+                            start_row, start_column, end_row, end_column])
+
+    sections = {"string_offsets": strings.offsets,
+                "string_data": array("B", strings.data),
+                "nodes": nodes_array,
+                "edge_offsets": graph.edge_offsets,
+                "edge_targets": graph.edge_targets,
+                "modules": modules_array,
+                "module_members": members_array}
+
+    header_fields = []
+    offset = HEADER.size
+    for name, _ in SECTIONS:
+        offset += -offset % SECTION_ALIGNMENT
+        header_fields.extend([offset, len(sections[name])])
+        offset += len(sections[name]) * sections[name].itemsize
+
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(RESULT_MAGIC, RESULT_VERSION, *header_fields))
+        for name, _ in SECTIONS:
+            f.write(b"\0" * (-f.tell() % SECTION_ALIGNMENT))
+            section = sections[name]
+            # The format is little-endian
+            if sys.byteorder == "big" and section.itemsize > 1:
+                section = array(section.typecode, section)
+                section.byteswap()
+            f.write(section.tobytes())
+
+
+class ExtractionResult:
+    """
+    Extraction result read from a file written by save_result. Sections are used in place (without
+    copy when the file is memory-mapped), strings and nodes are only decoded when they are accessed
+
+    Attributes:
+        modules (list): paths of the extracted modules, in the saved order
+    """
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        header = HEADER.unpack_from(view, 0)
+        if header[0] != RESULT_MAGIC:
+            raise ValueError("not a pydepcall result file")
+        if header[1] != RESULT_VERSION:
+            raise ValueError("unsupported result version {}".format(header[1]))
+
+        self._sections = {}
+        for i, (name, typecode) in enumerate(SECTIONS):
+            offset, count = header[2 + 2 * i], header[3 + 2 * i]
+            itemsize = array(typecode).itemsize
+            section = view[offset:offset + count * itemsize]
+            if typecode == "B":
+                self._sections[name] = section
+            elif sys.byteorder == "big":
+                swapped = array(typecode, section.tobytes())
+                swapped.byteswap()
+                self._sections[name] = memoryview(swapped)
+            else:
+                self._sections[name] = section.cast(typecode)
+
+        self._strings = {}
+        self._source_files = {}
+        self._nodes = {}
+        self._module_index = None
+
+    @property
+    def modules(self) -> List[str]:
+        modules = self._sections["modules"]
+        return [self.string(modules[i * MODULE_SIZE]) for i in range(len(modules) // MODULE_SIZE)]
+
+    @property
+    def node_count(self) -> int:
+        return len(self._sections["nodes"]) // NODE_SIZE
+
+    def __len__(self) -> int:
+        return len(self._sections["modules"]) // MODULE_SIZE
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.modules)
+
+    def __contains__(self, module: str) -> bool:
+        return module in self.module_index
+
+    def __getitem__(self, module: str) -> ModuleNode:
+        return self.module(self.module_index[module])
+
+    @property
+    def module_index(self) -> Dict[str, int]:
+        if self._module_index is None:
+            self._module_index = {path: i for i, path in enumerate(self.modules)}
+        return self._module_index
+
+    def string_bytes(self, string_id: int) -> memoryview:
+        offsets = self._sections["string_offsets"]
+        return self._sections["string_data"][offsets[string_id]:offsets[string_id + 1]]
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id == NONE_ID:
+            return None
+        if string_id not in self._strings:
+            self._strings[string_id] = str(self.string_bytes(string_id), "utf8")
+        return self._strings[string_id]
+
+    def record(self, node_id: int) -> Dict[str, int]:
+        """
+        Integer fields of a node (see NODE_FIELDS)
+        """
+        return dict(zip(NODE_FIELDS, self._sections["nodes"][node_id * NODE_SIZE:(node_id + 1) * NODE_SIZE]))
+
+    def children_ids(self, node_id: int) -> memoryview:
+        edge_offsets = self._sections["edge_offsets"]
+        return self._sections["edge_targets"][edge_offsets[node_id]:edge_offsets[node_id + 1]]
+
+    def module(self, index: int) -> ModuleNode:
+        """
+        Build the ModuleNode of the index-th module, with the nodes it depends on
+        """
+        path_id, members_start, n_functions, n_imports = self._sections["modules"][index * MODULE_SIZE:(index + 1) * MODULE_SIZE]
+        members = self._sections["module_members"][members_start:members_start + n_functions + n_imports]
+        module_node = ModuleNode(path= self.string(path_id))
+        module_node.function_list.extend(self.node(x) for x in members[:n_functions])
+        module_node.import_list.extend(self.node(x) for x in members[n_functions:])
+        return module_node
+
+    def to_dict(self) -> Dict[str, ModuleNode]:
+        """
+        The result as returned by repo_extract
+        """
+        return {path: self.module(i) for i, path in enumerate(self.modules)}
+
+    def node(self, node_id: int):
+        """
+        Build a node and the nodes it (transitively) depends on. Nodes are built once
+        """
+        if node_id in self._nodes:
+            return self._nodes[node_id]
+
+        built = []
+        queue = deque([node_id])
+        self._nodes[node_id] = self.build_node(node_id)
+        while queue:
+            current = queue.popleft()
+            built.append(current)
+            for child_id in self.children_ids(current):
+                if child_id not in self._nodes:
+                    self._nodes[child_id] = self.build_node(child_id)
+                    queue.append(child_id)
+
+        for current in built:
+            if hasattr(self._nodes[current], "children"):
+                self._nodes[current].children = [self._nodes[x] for x in self.children_ids(current)]
+        return self._nodes[node_id]
+
+    def build_node(self, node_id: int):
+        record = self.record(node_id)
+        node_class = NODE_CLASSES[record["kind"]]
+        node = node_class.__new__(node_class)
+        node.path = self.string(record["path"])
+        node.position_in_file = ((record["start_row"], record["start_column"]), (record["end_row"], record["end_column"]))
+        node.tree_sitter_node = None
+        node.source_file = self.source_file(record["source"])
+        node.start_byte = record["start_byte"] if record["start_byte"] != NONE_ID else None
+        node.end_byte = record["end_byte"] if record["end_byte"] != NONE_ID else None
+        node.content = self.string(record["content"])
+        if record["name"] != NONE_ID:
+            node.name = self.string(record["name"])
+        if record["metadata"] != NONE_ID:
+            for attribute, value in json.loads(self.string(record["metadata"])).items():
+                setattr(node, attribute, value)
+        if node_class in [FunctionNode, ImportNode]:
+            node.children = []
+        return node
+
+    def dependency_graph(self) -> DependencyGraph:
+        """
+        Integer dependency graph of the result, using the saved edge arrays. Nodes are built when they are read
+        """
+        return DependencyGraph(self._sections["edge_offsets"], self._sections["edge_targets"], ResultNodes(self))
+
+    def source_file(self, string_id: int) -> Optional[SourceFile]:
+        if string_id == NONE_ID:
+            return None
+        if string_id not in self._source_files:
+            # the source is a view on the result, the tree is parsed again if it is needed
+            self._source_files[string_id] = SourceFile(self.string_bytes(string_id))
+        return self._source_files[string_id]
+
+
+class ResultNodes:
+    """
+    Nodes of an ExtractionResult by id, built on access
+    """
+    def __init__(self, result: ExtractionResult):
+        self.result = result
+
+    def __len__(self) -> int:
+        return self.result.node_count
+
+    def __getitem__(self, node_id: int):
+        return self.result.node(node_id)
+
+
+def load_result(input_path: str, use_mmap: bool= False) -> ExtractionResult:
+    """
+    Load an extraction result written by save_result
+
+    Args:
+        input_path: path of the result file
+        use_mmap: map the file in memory instead of reading it, sections and sources of the nodes are then used without copy
+    """
+    with open(input_path, "rb") as f:
+        if use_mmap:
+            buffer = mmap.mmap(f.fileno(), 0, access= mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+    return ExtractionResult(buffer)
@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, List, Set, Tuple
+import tree_sitter
+
+from .utils import get_node_by_kind
+
+# Entries are returned in the order of the original per-kind scans:
+# functions, then classes, then top-level statements (imports and blocks) in document order
+FUNCTION_RANK, CLASS_RANK, STATEMENT_RANK = 0, 1, 2
+
+
+class SymbolTable:
+    """
+    Symbol table of a module file, mapping each name to the definitions it could refer to
+
+    Attributes:
+        symbols (dict): name -> list of entries (rank, index, kind, name, node), where kind is
+            "function", "class", "import" or "block" (top-level expression statement, e.g. assignment)
+        entries (list): all entries of the module, ordered
+        entry_names (list): names referring to each entry of `entries`
+    """
+    def __init__(self, functions: List[Tuple[str, tree_sitter.Node]]= (), classes: List[Tuple[str, tree_sitter.Node]]= (), root_node: tree_sitter.Node= None):
+        self.symbols: Dict[str, List[Tuple]] = {}
+        self.entries: List[Tuple] = []
+        self.entry_names: List[List[str]] = []
+        if root_node is None:
+            return
+
+        for index, (name, node) in enumerate(functions):
+            self.add((FUNCTION_RANK, index, "function", name, node), [name])
+        for index, (name, node) in enumerate(classes):
+            self.add((CLASS_RANK, index, "class", name, node), [name])
+
+        # Do we need to consider decorated_definition @ ?
+        for index, node in enumerate(root_node.children):
+            if node.type in ["function_definition", "class_definition", "decorated_definition"]: # already consider function and class definition
+                continue
+            if "import" in node.type:
+                node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind=["dotted_name"])]
+                self.add((STATEMENT_RANK, index, "import", node.text.decode(), node), node_identifiers)
+            # only consider the first identifier
+            # only consider "expression_statement" ?
+            elif node.type in ["expression_statement"]:
+                node_identifiers = [x.text.decode() for x in get_node_by_kind(node, kind=["identifier"])]
+                if node_identifiers:
+                    self.add((STATEMENT_RANK, index, "block", node_identifiers[0], node), node_identifiers[:1])
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[Tuple, List[str]]]) -> "SymbolTable":
+        """
+        Build a symbol table from its entries and their names (see entry_names), e.g. computed by another process
+        """
+        symbol_table = cls()
+        for entry, names in entries:
+            symbol_table.add(entry, names)
+        return symbol_table
+
+    def add(self, entry: Tuple, names: Iterable[str]) -> None:
+        self.entries.append(entry)
+        self.entry_names.append(list(names))
+        for name in set(names):
+            self.symbols.setdefault(name, []).append(entry)
+
+    def select(self, names: Set[str], wildcard: bool= False, excluded_blocks: Iterable[str]= ()) -> List[Tuple]:
+        """
+        Get the entries referred by a set of names
+
+        Args:
+            names: referred names
+            wildcard: whether all functions, classes and imports are referred (star import)
+            excluded_blocks: names of blocks which should not be returned
+
+        Return:
+            List of entries (rank, index, kind, name, node) in module order
+        """
+        selected = {}
+        if wildcard:
+            for entry in self.entries:
+                if entry[2] != "block":
+                    selected[entry[:2]] = entry
+
+        for name in names & self.symbols.keys():
+            for entry in self.symbols[name]:
+                if entry[2] == "block" and entry[3] in excluded_blocks:
+                    continue
+                selected[entry[:2]] = entry
+        return [selected[key] for key in sorted(selected)]
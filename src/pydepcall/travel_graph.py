@@ -1,7 +1,10 @@
 import os
 
-from .utils import parse_import, get_root_node, get_node_by_kind
+from .utils import parse_import, get_node_by_kind
 from .constant import PY_EXTENSIONS
+from .parse_cache import ParseCache
+from .module_index import ModuleIndex
+from .build_repo_graph import is_file_entry
 
 def search_path(key: str, graph, tracks= []):
     """
@@ -14,14 +17,12 @@ def search_path(key: str, graph, tracks= []):
     """
     if key is None:
         tracks.append(graph)
-    else:
+    elif not is_file_entry(graph):
         for child in graph["childrens"]:
             if child == key or child in [key + x for x in PY_EXTENSIONS]:
-                if type(graph["childrens"]) is not list:
-                    tracks.append(graph["childrens"][child])
+                tracks.append(graph["childrens"][child])
             else:
-                if type(graph["childrens"]) is not list:
-                    search_path(key, graph["childrens"][child], tracks= tracks)
+                search_path(key, graph["childrens"][child], tracks= tracks)
 
 def verify_track(separated_path, module, track):
     if len(separated_path) == 0:
@@ -51,11 +52,11 @@ def verify_track(separated_path, module, track):
             if module + ".py" in module_childrens:
                 return track["childrens"][module + ".py"]["path"], True
             return track["childrens"][module_childrens[0]]["path"], True
+    elif is_file_entry(track):
+        # a file has no submodule
+        return False, False
     else:
-        if type(track["childrens"]) is list:
-            module_childrens = set(track["childrens"]).intersection(set([separated_path[0] + py_ext for py_ext in PY_EXTENSIONS]))
-        else:
-            module_childrens = set(track["childrens"].keys()).intersection(set([separated_path[0] + py_ext for py_ext in PY_EXTENSIONS]))
+        module_childrens = set(track["childrens"].keys()).intersection(set([separated_path[0] + py_ext for py_ext in PY_EXTENSIONS]))
         module_childrens = list(module_childrens)
         assert len(module_childrens) <= 1, module_childrens
 
@@ -63,12 +64,8 @@ def verify_track(separated_path, module, track):
             return False, False
         else:
             if separated_path[0] in track["childrens"]:
-                if type(track["childrens"]) is list:
-                    return False, False
                 return verify_track(separated_path[1:], module, track["childrens"][separated_path[0]])
             else:
-                if type(track["childrens"]) is list:
-                    return False, False
                 return verify_track(separated_path[1:], module, track["childrens"][module_childrens[0]])
 
 def search_by_repo_graph(import_detail, repo_graph, current_path):
@@ -109,76 +106,112 @@ def search_by_repo_graph(import_detail, repo_graph, current_path):
     return None, None
 
 
-def import_analyze(import_nodes, filepath, repo_graph):
+def search_by_relative_path(import_detail, filepath, parse_cache: ParseCache, module_index: ModuleIndex= None):
+    """
+    Resolve a relative import (from . import abc, from ..abc import xyz) from the file system
+
+    Args:
+        import_detail (Dict): parsed import (see parse_import)
+        filepath (str): path of the file containing the import
+        parse_cache (ParseCache): cache of parsed files shared in the run
+        module_index (ModuleIndex): if given, file system facts and __init__ identifiers are cached in it
+
+    Return:
+        import_path (str or None), import_file_or_folder (bool)
+    """
+    if module_index is not None:
+        exists, isdir = module_index.exists, module_index.isdir
+        init_identifiers = lambda init_path: module_index.file_identifiers(init_path, parse_cache)
+    else:
+        exists, isdir = os.path.exists, os.path.isdir
+        init_identifiers = lambda init_path: [x.text.decode() for x in get_node_by_kind(parse_cache.get(init_path).root_node, kind=["identifier"])]
+
+    import_path = None
+    import_file_or_folder = False
+
+    RELATIVE_IMPORT_PREFIXS = ["...", "..", "."]
+    for import_prefix in RELATIVE_IMPORT_PREFIXS:
+        if import_detail["package"] is not None and import_detail["package"].startswith(import_prefix):
+            start_dir = filepath
+            for _ in range(len(import_prefix)):
+                start_dir = os.path.dirname(start_dir)
+            
+            if import_detail["package"] != import_prefix:
+                for py_ext in PY_EXTENSIONS:
+                    if exists(os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/") + py_ext)): # from file import module 
+                        import_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/") + py_ext)
+                        import_file_or_folder = False
+                    elif exists(os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"] + py_ext)): # from folder import file
+                        import_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"] + py_ext)
+                        import_file_or_folder = True
+                    if import_path:
+                        break
+                # Some functions might be imported from __init__ file
+                if not import_path:
+                    init_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), "__init__.py")
+                    import_dir = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"])
+                    if exists(init_path): # from folder import module in init file
+                        if import_detail["module"] in init_identifiers(init_path):
+                            import_path = init_path
+                            import_file_or_folder = False
+                    elif isdir(import_dir): # from folder import folder
+                        # if os.path.exists(os.path.join(import_dir, "__init__.py")):
+                        #     import_path = os.path.join(import_dir, "__init__.py")
+                        import_path = import_dir
+                        import_file_or_folder = True
+            else:
+                for py_ext in PY_EXTENSIONS:
+                    if exists(os.path.join(start_dir, import_detail["module"] + py_ext)):
+                        import_path = os.path.join(start_dir, import_detail["module"] + py_ext) # from folder import file
+                        import_file_or_folder = True
+                    if import_path:
+                        break
+                    
+                if not import_path:
+                    if isdir(os.path.join(start_dir, import_detail["module"])): # from folder import folder 
+                        import_path = os.path.join(start_dir, import_detail["module"])
+                        import_file_or_folder = True
+                    elif exists(os.path.join(start_dir, "__init__.py")): # from folder import module in init file
+                        if import_detail["module"] in init_identifiers(os.path.join(start_dir, "__init__.py")):
+                            import_path = os.path.join(start_dir, "__init__.py")
+                            import_file_or_folder = False
+        if import_path:
+            break
+    return import_path, import_file_or_folder
+
+
+def import_analyze(import_nodes, filepath, repo_graph, parse_cache: ParseCache= None, module_index: ModuleIndex= None):
     import_details = []
     for import_node in import_nodes:
         import_details.extend(parse_import(import_node))
+    return resolve_imports(import_details, filepath, repo_graph, parse_cache, module_index)
+
+
+def resolve_imports(import_details, filepath, repo_graph, parse_cache: ParseCache= None, module_index: ModuleIndex= None):
+    """
+    Resolve parsed imports (see parse_import) of a file, adding "import_path" and "import_file_or_folder" to each of them
+    """
+    if parse_cache is None:
+        parse_cache = ParseCache()
 
-    RELATIVE_IMPORT_PREFIXS = ["...", "..", "."]
     for import_detail in import_details:
-        import_path = None
-        import_file_or_folder = False
-
-        for import_prefix in RELATIVE_IMPORT_PREFIXS:
-            if import_detail["package"] is not None and import_detail["package"].startswith(import_prefix):
-                start_dir = filepath
-                for _ in range(len(import_prefix)):
-                    start_dir = os.path.dirname(start_dir)
-                
-                if import_detail["package"] != import_prefix:
-                    for py_ext in PY_EXTENSIONS:
-                        if os.path.exists(os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/") + py_ext)): # from file import module 
-                            import_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/") + py_ext)
-                            import_file_or_folder = False
-                        elif os.path.exists(os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"] + py_ext)): # from folder import file
-                            import_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"] + py_ext)
-                            import_file_or_folder = True
-                        if import_path:
-                            break
-                    # Some functions might be imported from __init__ file
-                    if not import_path:
-                        init_path = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), "__init__.py")
-                        import_dir = os.path.join(start_dir, import_detail["package"][len(import_prefix):].replace(".", "/"), import_detail["module"])
-                        if os.path.exists(init_path): # from folder import module in init file
-                            with open(init_path, "r") as f:
-                                init_content = f.read()
-                            file_root_node= get_root_node(init_content)
-
-                            if import_detail["module"] in [x.text.decode() for x in get_node_by_kind(file_root_node, kind=["identifier"])]:
-                                import_path = init_path
-                                import_file_or_folder = False
-                        elif os.path.isdir(import_dir): # from folder import folder
-                            # if os.path.exists(os.path.join(import_dir, "__init__.py")):
-                            #     import_path = os.path.join(import_dir, "__init__.py")
-                            import_path = import_dir
-                            import_file_or_folder = True
+        # The same import in the same directory is always resolved to the same path
+        resolution_key = (os.path.dirname(filepath), import_detail["package"], import_detail["module"])
+        if module_index is not None and resolution_key in module_index.resolution_cache:
+            module_index.hits += 1
+            import_path, import_file_or_folder = module_index.resolution_cache[resolution_key]
+        else:
+            import_path, import_file_or_folder = search_by_relative_path(import_detail, filepath, parse_cache, module_index)
+            if not import_path:
+                if module_index is not None:
+                    import_path, import_file_or_folder = module_index.resolve(import_detail)
                 else:
-                    for py_ext in PY_EXTENSIONS:
-                        if os.path.exists(os.path.join(start_dir, import_detail["module"] + py_ext)):
-                            import_path = os.path.join(start_dir, import_detail["module"] + py_ext) # from folder import file
-                            import_file_or_folder = True
-                        if import_path:
-                            break
-                        
-                    if not import_path:
-                        if os.path.isdir(os.path.join(start_dir, import_detail["module"])): # from folder import folder 
-                            import_path = os.path.join(start_dir, import_detail["module"])
-                            import_file_or_folder = True
-                        elif os.path.exists(os.path.join(start_dir, "__init__.py")): # from folder import module in init file
-                            with open(os.path.join(start_dir, "__init__.py"), "r") as f:
-                                init_content = f.read()
-                            file_root_node= get_root_node(init_content)
-
-                            if import_detail["module"] in [x.text.decode() for x in get_node_by_kind(file_root_node, kind=["identifier"])]:
-                                import_path = os.path.join(start_dir, "__init__.py")
-                                import_file_or_folder = False
-            if import_path:
-                break
-        
-        if not import_path:
-            import_path, import_file_or_folder = search_by_repo_graph(import_detail, repo_graph, filepath)
+                    import_path, import_file_or_folder = search_by_repo_graph(import_detail, repo_graph, filepath)
 
+            if module_index is not None:
+                module_index.misses += 1
+                module_index.resolution_cache[resolution_key] = (import_path, import_file_or_folder)
 
         import_detail["import_path"] = import_path
         import_detail["import_file_or_folder"] = import_file_or_folder
-    return import_details
\ No newline at end of file
+    return import_details
@@ -1,3 +1,3 @@
 from .utils import clone_repo, remove_empty_line, fix_white_space, find_all_substring
-from .parser_utils import (language_parser, get_node_by_kind, get_root_node, \
-    code_basic_clean, remove_comment, remove_content, get_import_nodes, parse_import, decorated_clean)
\ No newline at end of file
+from .parser_utils import (PY_LANGUAGE, language_parser, get_node_by_kind, iter_node_by_kind, get_root_node, \
+    code_basic_clean, remove_comment, remove_content, remove_ranges, remove_nodes, map_line_to_id, get_import_nodes, parse_import, decorated_clean, get_definition_name)
\ No newline at end of file
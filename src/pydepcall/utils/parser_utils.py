@@ -1,27 +1,42 @@
-from typing import List, Dict
+from typing import Iterator, List, Dict
 import tree_sitter
 import tree_sitter_python as tspython
 from tree_sitter import Language, Parser
-import sys
-sys.setrecursionlimit(200)
 
 PY_LANGUAGE = Language(tspython.language())
 language_parser = Parser(PY_LANGUAGE)
 
-def traverse_type(node, results, kind, ignore_kind, avoid_nested= False) -> None:    
-    if kind is None:
-        results.append(node)
-    elif node.type in kind:
-        results.append(node)
-        # avoid nested node (e.g. function, class) by not stop traveling if node type is found
-        if avoid_nested:
-            return 
-    if not node.children:
-        return
-    for n in node.children:
-        if n.type in ignore_kind:
+def iter_node_by_kind(root: tree_sitter.Node, kind: List[str], ignore_kind: List[str]=[], avoid_nested: bool= False) -> Iterator[tree_sitter.Node]:
+    """
+    Iterate over all nodes with specific type in pre-order, without recursion (see get_node_by_kind)
+    
+    Args:
+        root (tree_sitter.Node): Tree sitter root node
+        kind (List[str]): (node's) type that want to get, all nodes if None
+        ignore_kind (List[str]): (node's) type that DON'T want to get
+        avoid_nested (bool): whether to avoid travel nested node with same type
+    """
+    # nodes to visit, the next one last. Listing the children at once is cheaper than moving a TreeCursor node by node
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node_type = node.type
+        # the root is never ignored
+        if node_type in ignore_kind and node is not root:
             continue
-        traverse_type(n, results, kind, ignore_kind, avoid_nested= avoid_nested)
+        if kind is None:
+            yield node
+        elif node_type in kind:
+            yield node
+            # avoid nested node (e.g. function, class) by not stop traveling if node type is found
+            if avoid_nested:
+                continue
+        children = node.children
+        if children:
+            stack.extend(reversed(children))
+
+def traverse_type(node, results, kind, ignore_kind, avoid_nested= False) -> None:
+    results.extend(get_node_by_kind(node, kind, ignore_kind, avoid_nested= avoid_nested))
 
 def get_node_by_kind(root: tree_sitter.Node, kind: List[str], ignore_kind: List[str]=[], avoid_nested: bool= False) -> List:
     """
@@ -36,10 +51,24 @@ def get_node_by_kind(root: tree_sitter.Node, kind: List[str], ignore_kind: List[
     Return:
         List[tree_sitter.Node]: List of all 
     """
-
-    node_list = []
-    traverse_type(root, node_list, kind=kind, ignore_kind= ignore_kind, avoid_nested= avoid_nested)
-    return node_list
+    # same walk as iter_node_by_kind, without the overhead of a generator
+    results = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node_type = node.type
+        if node_type in ignore_kind and node is not root:
+            continue
+        if kind is None:
+            results.append(node)
+        elif node_type in kind:
+            results.append(node)
+            if avoid_nested:
+                continue
+        children = node.children
+        if children:
+            stack.extend(reversed(children))
+    return results
 
 def get_root_node(content: str) -> tree_sitter.Node:
     """
@@ -51,6 +80,18 @@ def get_root_node(content: str) -> tree_sitter.Node:
     root = language_parser.parse(bytes(content, "utf8"))
     return root.root_node
 
+def get_definition_name(node: tree_sitter.Node) -> str:
+    """
+    Get the name of a function or class definition node
+    
+    Args:
+        node: tree-sitter node of the definition
+    """
+    for children in node.children:
+        if children.type == "identifier":
+            return children.text.decode()
+    return ""
+
 def get_import_nodes(content: str) -> List[tree_sitter.Node]:
     """
     Obtain all import statments in a code file
@@ -121,39 +162,73 @@ def decorated_clean(content: str) -> str:
             new_lines.append(line)
     return "\n".join(new_lines)
 
-def map_line_to_id(content: str) -> Dict:
-    line2id = {}
-    tmp = []
-    for lid, line in enumerate(content.splitlines()):
-        if lid == 0:
-            line2id[lid] = 0
-        else:
-            line2id[lid] = len(bytes("\n".join([x.decode("utf8") for x in tmp]), "utf8")) + 1 # plus 1 extra new lines
-        tmp.append(line)
-    return line2id
-
-def remove_content(content: str, rm_position: List) -> str:
-    content = bytes(content, "utf8")
-    line2id = map_line_to_id(content)
-    new_rm_position = [0]
-    for pos in rm_position:
-        new_rm_position.extend([line2id[pos[0][0]]+ pos[0][1], line2id[pos[1][0]]+ pos[1][1]]) 
-    new_rm_position.append(len(content))
-
-    new_content= ''
-    for pos_id in range(0, len(new_rm_position), 2):
-        new_content += content[new_rm_position[pos_id]:new_rm_position[pos_id+1]].decode("utf8")
-    return new_content
+def line_offsets(content: bytes) -> List[int]:
+    """
+    Byte offset of the start of each line, lines being separated by "\n" as in tree-sitter points
+
+    Args:
+        content: encoded content
+    """
+    offsets = [0]
+    newline = content.find(b"\n")
+    while newline != -1:
+        offsets.append(newline + 1)
+        newline = content.find(b"\n", newline + 1)
+    return offsets
+
+def map_line_to_id(content: str | bytes) -> Dict:
+    """
+    Map each line number of the content to the byte offset of its start
+    """
+    if isinstance(content, str):
+        content = bytes(content, "utf8")
+    return dict(enumerate(line_offsets(content)))
+
+def remove_ranges(content: str | bytes, ranges: List) -> str:
+    """
+    Remove byte ranges from the content in one pass
+
+    Args:
+        content: text or encoded content
+        ranges: (start byte, end byte) to remove, e.g. (node.start_byte, node.end_byte) of tree-sitter nodes;
+            they may be unsorted and overlap
+    
+    Return:
+        decoded content without the ranges
+    """
+    if isinstance(content, str):
+        content = bytes(content, "utf8")
+    chunks = []
+    last = 0
+    for start, end in sorted(ranges):
+        if start > last:
+            chunks.append(content[last:start])
+        last = max(last, end)
+    chunks.append(content[last:])
+    return b"".join(chunks).decode("utf8")
+
+def remove_nodes(content: str | bytes, nodes: List[tree_sitter.Node]) -> str:
+    """
+    Remove the text of tree-sitter nodes of the parsed content in one pass (see remove_ranges)
+    """
+    return remove_ranges(content, [(node.start_byte, node.end_byte) for node in nodes])
+
+def remove_content(content: str | bytes, rm_position: List) -> str:
+    """
+    Remove ranges given as tree-sitter points ((start row, start column), (end row, end column))
+    from the content (see remove_ranges)
+    """
+    if isinstance(content, str):
+        content = bytes(content, "utf8")
+    offsets = line_offsets(content)
+    return remove_ranges(content, [(offsets[start[0]] + start[1], offsets[end[0]] + end[1]) for start, end in rm_position])
 
 def remove_comment(content: str) -> str:
     root_node = get_root_node(content)
+    comments = get_node_by_kind(root_node, kind= ["comment"])
 
-    positions = []
-    for node in get_node_by_kind(root_node, kind= ["comment"]):
-        positions.append((node.start_point, node.end_point))
-
-    if positions:
-        cleaned_content = remove_content(content, positions)
+    if comments:
+        cleaned_content = remove_nodes(content, comments)
     else:
         cleaned_content = content
     return cleaned_content.strip()
@@ -166,13 +241,13 @@ def code_basic_clean(file_content: str) -> str:
     """
     root_node = get_root_node(file_content)
 
-    positions = []
+    removed_nodes = []
     for node in root_node.children:
         if node.type == "comment" or (node.type == 'expression_statement' and node.children[0].type == 'string'):
-            positions.append((node.start_point, node.end_point))
+            removed_nodes.append(node)
 
-    if positions:
-        cleaned_content = remove_content(bytes(file_content, "utf8"), positions)
+    if removed_nodes:
+        cleaned_content = remove_nodes(file_content, removed_nodes)
     else:
         cleaned_content = file_content
 